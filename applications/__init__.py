@@ -1,4 +1,5 @@
 import os
+import asyncio
 
 from dotenv import load_dotenv
 from multiprocessing import Process
@@ -40,6 +41,17 @@ class ProcessAllocation():
         if not status:
             log.critical('startup', 'Exiting Application ...')
             # Return Here to Exit Application (or call sys.exit)
+        else:
+            # Imported here so `python -m applications.api.migrations` does not load the module twice
+            from .api.migrations import migrate, MigrationError
+
+            log.trace('startup', 'Applying Schema Migrations ...')
+
+            try:
+                asyncio.run(migrate(log))
+            except MigrationError as error:
+                log.critical('startup', f'Schema Migrations Failed - {error}')
+                return
 
         if cls.tokens['discord']:
             bot = Process(target=connect, args=(cls.tokens['discord'], log))
@@ -0,0 +1,258 @@
+import os
+import json
+import zlib
+import asyncio
+import hashlib
+
+from os.path import abspath, exists, join
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple, Optional, AsyncIterator
+
+
+# Tables covered by a leveling backup, with the primary key each one is chunked by
+tables = {
+    "guild_levels": ('guild_id', 'user_id'),
+    "user_levels": ('user_id', )
+}
+
+manifest_name = 'manifest.json'
+read_size = 1 << 20
+
+
+def default_directory() -> str:
+    return abspath(__file__).replace('api/backup.py', '$tmp/backups/')
+
+
+def checksum(path: str) -> str:
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(read_size), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+class ChunkWriter():
+    ''' Gzip-Compresses COPY Output straight to Disk, Hashing the Compressed Bytes as they are Written '''
+
+    def __init__(self, path: str, *, level: int):
+        self.path = path
+        self.file = open(path, 'wb')
+
+        # wbits=31 writes a gzip container, so a chunk can also be inspected with standard tools
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def _emit(self, data: bytes) -> None:
+        if data:
+            self.file.write(data)
+            self.digest.update(data)
+            self.size += len(data)
+
+    def _write(self, data: bytes) -> None:
+        self._emit(self.compressor.compress(data))
+
+    async def write(self, data: bytes) -> None:
+        # Compression and the file write both block - COPY awaits each block, so they stay in order
+        await asyncio.get_running_loop().run_in_executor(None, self._write, data)
+
+    def close(self) -> None:
+        self._emit(self.compressor.flush())
+        self.file.close()
+
+
+def read_block(source: Any, decompressor: Any) -> Optional[bytes]:
+    ''' Next decompressed block of a chunk file - None at the end of the file '''
+
+    block = source.read(read_size)
+    if not block:
+        return None
+
+    return decompressor.decompress(block)
+
+
+async def read_chunk(path: str) -> AsyncIterator[bytes]:
+    ''' Decompresses a chunk file block by block for `copy_to_table`, off the event loop '''
+
+    loop = asyncio.get_running_loop()
+    decompressor = zlib.decompressobj(31)
+
+    with open(path, 'rb') as source:
+        while True:
+            data = await loop.run_in_executor(None, read_block, source, decompressor)
+            if data is None:
+                break
+
+            if data:
+                yield data
+
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+class LevelBackup():
+    ''' Chunked, Compressed Binary COPY Backups of the Leveling Tables '''
+
+    def __init__(self, connector: Any, *, directory: Optional[str] = None, chunk_rows: int,
+                 workers: int, level: int):
+        self.connector = connector
+        self.directory = directory or default_directory()
+
+        self.chunk_rows = chunk_rows
+        self.workers = asyncio.Semaphore(workers)
+        self.level = level
+
+    # Region: Helpers
+
+    @staticmethod
+    def _range(key: Tuple[str, ...], lower: Optional[list], upper: Optional[list]) -> Tuple[str, list]:
+        ''' WHERE clause (and arguments) selecting keys in `(lower, upper]` '''
+
+        columns = f'({", ".join(key)})'
+        clauses, args = [], []
+
+        for bound, operator in ((lower, '>'), (upper, '<=')):
+            if bound is None:
+                continue
+
+            placeholders = ', '.join(f'${len(args) + i + 1}' for i in range(len(bound)))
+            clauses.append(f'{columns} {operator} ({placeholders})')
+            args.extend(bound)
+
+        return (f' WHERE {" AND ".join(clauses)}' if clauses else ''), args
+
+    def backups(self) -> List[str]:
+        if not exists(self.directory):
+            return []
+
+        names = [name for name in os.listdir(self.directory) if exists(join(self.directory, name, manifest_name))]
+
+        return sorted(names)
+
+    def load_manifest(self, name: str) -> Dict[str, Any]:
+        with open(join(self.directory, name, manifest_name), encoding='UTF-8') as file:
+            return json.load(file)
+
+    # End Region
+
+    # Region: Export
+
+    async def create(self) -> Tuple[str, Dict[str, Any]]:
+        name = datetime.now(timezone.utc).strftime('levels-%Y%m%dT%H%M%S%fZ')
+        target = join(self.directory, name)
+
+        # Never shared - a second backup writing into the same directory would overwrite these chunks
+        os.makedirs(self.directory, exist_ok=True)
+        os.makedirs(target)
+
+        manifest = {
+            "name": name,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "format": 'binary+gzip',
+            "tables": {}
+        }
+
+        async with self.connector.connect() as coordinator:
+            # The coordinator only holds the snapshot open - every chunk reads through it on its own connection
+            async with coordinator.transaction(isolation='repeatable_read', readonly=True):
+                snapshot = await coordinator.fetchval('SELECT pg_export_snapshot()')
+                exports = []
+
+                for table, key in tables.items():
+                    columns = ', '.join(key)
+                    boundaries = await coordinator.fetch(
+                        f'SELECT {columns} FROM (SELECT {columns}, row_number() OVER (ORDER BY {columns}) AS position '
+                        f'FROM {table}) AS keyed WHERE position % $1 = 0',
+                        self.chunk_rows
+                    )
+
+                    # Primary key ranges of roughly `chunk_rows` rows, exported in parallel from the one snapshot
+                    bounds = [None] + [list(record.values()) for record in boundaries] + [None]
+                    chunks = manifest["tables"][table] = {"key": list(key), "chunks": []}
+
+                    for number, (lower, upper) in enumerate(zip(bounds, bounds[1:])):
+                        chunk = {"file": f'{table}.{number:05d}.bin.gz', "lower": lower, "upper": upper}
+                        chunks["chunks"].append(chunk)
+
+                        exports.append(self.export_chunk(snapshot, table, key, chunk, target))
+
+                await asyncio.gather(*exports)
+
+        with open(join(target, manifest_name + '.partial'), 'w', encoding='UTF-8') as file:
+            json.dump(manifest, file, indent=4)
+
+        # The manifest appears last and atomically - a directory without one is never treated as a backup
+        os.replace(join(target, manifest_name + '.partial'), join(target, manifest_name))
+
+        return name, manifest
+
+    async def export_chunk(self, snapshot: str, table: str, key: Tuple[str, ...], chunk: dict, target: str) -> None:
+        where, args = self._range(key, chunk["lower"], chunk["upper"])
+        query = f'SELECT * FROM {table}{where} ORDER BY {", ".join(key)}'
+
+        async with self.workers:
+            async with self.connector.connect() as connection:
+                async with connection.transaction(isolation='repeatable_read', readonly=True):
+                    await connection.execute(f"SET TRANSACTION SNAPSHOT '{snapshot}'")
+
+                    writer = ChunkWriter(join(target, chunk["file"]), level=self.level)
+                    try:
+                        status = await connection.copy_from_query(query, *args, output=writer.write, format='binary')
+                    finally:
+                        writer.close()
+
+        chunk["rows"] = int(status.split()[-1])
+        chunk["bytes"] = writer.size
+        chunk["sha256"] = writer.digest.hexdigest()
+
+    # End Region
+
+    # Region: Restore
+
+    async def verify(self, name: str, manifest: Dict[str, Any]) -> List[str]:
+        ''' Files that are missing or fail their checksum - hashed in worker threads, in parallel '''
+
+        loop = asyncio.get_running_loop()
+        chunks = [chunk for table in manifest["tables"].values() for chunk in table["chunks"]]
+
+        async def check(chunk: dict) -> bool:
+            path = join(self.directory, name, chunk["file"])
+            if not exists(path):
+                return False
+
+            return await loop.run_in_executor(None, checksum, path) == chunk["sha256"]
+
+        results = await asyncio.gather(*(check(chunk) for chunk in chunks))
+
+        return [chunk["file"] for chunk, valid in zip(chunks, results) if not valid]
+
+    async def restore(self, name: str, manifest: Dict[str, Any]) -> Dict[str, int]:
+        ''' Replaces the table contents with the backup - all or nothing '''
+
+        restored = {table: 0 for table in manifest["tables"]}
+
+        # The truncate and every chunk share one transaction - a chunk that fails to load leaves the tables as they were
+        async with self.connector.connect() as connection:
+            async with connection.transaction():
+                await connection.execute(f'TRUNCATE {", ".join(manifest["tables"])}')
+
+                # Chunks load one after another, not under `workers` like the export - the single transaction
+                # pins them to one connection, which runs one COPY at a time. Each chunk is still decompressed
+                # in worker threads, block by block, while the previous block is sent
+                for table, contents in manifest["tables"].items():
+                    for chunk in contents["chunks"]:
+                        path = join(self.directory, name, chunk["file"])
+                        restored[table] += await self.import_chunk(connection, table, path)
+
+        return restored
+
+    @staticmethod
+    async def import_chunk(connection: Any, table: str, path: str) -> int:
+        status = await connection.copy_to_table(table, source=read_chunk(path), format='binary')
+
+        return int(status.split()[-1])
+
+    # End Region
@@ -0,0 +1,275 @@
+import time
+import asyncio
+
+from typing import Any, Awaitable, Callable, Dict, List, Tuple, Optional
+
+
+class ExperienceBuffer():
+    ''' Merges Pending XP Increments in Memory until they are Flushed as one Batch '''
+
+    def __init__(self, *, max_pending: int, flush_interval: float):
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+
+        # (guild_id, user_id) -> [experience, artificial] and user_id -> experience
+        self.guilds: Dict[Tuple[int, int], List[int]] = {}
+        self.users: Dict[int, int] = {}
+
+        # Deltas drained by a flush that has not committed yet - still visible to readers
+        self.inflight_guilds: Dict[Tuple[int, int], List[int]] = {}
+        self.inflight_users: Dict[int, int] = {}
+
+        self.opened: Optional[float] = None
+
+        # Bumped when a flush drains the buffer and again when it settles - a read that starts while
+        # no flush is in flight and ends on the same epoch saw the tables and these deltas consistently
+        self.epoch = 0
+        self.flushing = False
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+        self.flushes = 0
+        self.failures = 0
+        self.flushed_rows = 0
+        self.last_batch = 0
+        self.largest_batch = 0
+        self.last_latency = 0.0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def __len__(self) -> int:
+        return len(self.guilds) + len(self.users)
+
+    def add(self, userId: int, *, guildId: Optional[int], amount: int, artificial: bool = False) -> None:
+        if self.opened is None:
+            self.opened = time.monotonic()
+
+        if guildId:
+            pending = self.guilds.get((guildId, userId))
+            if pending is None:
+                pending = self.guilds[(guildId, userId)] = [0, 0]
+
+            pending[0] += amount
+            if artificial:
+                pending[1] += amount
+
+        if not artificial:
+            self.users[userId] = self.users.get(userId, 0) + amount
+
+    def pending_guild(self, *, guildId: int, userId: int) -> Tuple[int, int]:
+        key = (guildId, userId)
+        experience = artificial = 0
+
+        for source in (self.guilds, self.inflight_guilds):
+            if key in source:
+                experience += source[key][0]
+                artificial += source[key][1]
+
+        return experience, artificial
+
+    def pending_members(self, *, guildId: int) -> Dict[int, int]:
+        ''' user_id -> pending experience for every member of one guild with a buffered delta '''
+
+        members = {}
+
+        for source in (self.guilds, self.inflight_guilds):
+            for (guild, user), (experience, _) in source.items():
+                if guild == guildId:
+                    members[user] = members.get(user, 0) + experience
+
+        return members
+
+    def pending_global(self, *, userId: int) -> int:
+        return self.users.get(userId, 0) + self.inflight_users.get(userId, 0)
+
+    def due(self) -> bool:
+        if len(self) >= self.max_pending:
+            return True
+
+        return self.opened is not None and time.monotonic() - self.opened >= self.flush_interval
+
+    def drain(self) -> Tuple[List[tuple], List[tuple]]:
+        ''' Moves every pending delta in-flight and returns them as COPY-ready records '''
+
+        self.inflight_guilds, self.guilds = self.guilds, {}
+        self.inflight_users, self.users = self.users, {}
+        self.opened = None
+
+        self.epoch += 1
+        self.flushing = True
+        self.idle.clear()
+
+        guild_records = [
+            (guild, user, xp, artificial) for (guild, user), (xp, artificial) in self.inflight_guilds.items()
+        ]
+        user_records = [(user, xp) for user, xp in self.inflight_users.items()]
+
+        return guild_records, user_records
+
+    async def settled(self) -> int:
+        ''' Waits out any flush in flight and returns the epoch a read should end on '''
+
+        while self.flushing:
+            await self.idle.wait()
+
+        return self.epoch
+
+    def _settle(self) -> None:
+        self.inflight_guilds = {}
+        self.inflight_users = {}
+
+        self.epoch += 1
+        self.flushing = False
+        self.idle.set()
+
+    def commit(self, *, latency: float) -> None:
+        batch = len(self.inflight_guilds) + len(self.inflight_users)
+        self._settle()
+
+        self.flushes += 1
+        self.flushed_rows += batch
+        self.last_batch = batch
+        self.largest_batch = max(self.largest_batch, batch)
+
+        self.last_latency = latency
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def rollback(self) -> None:
+        ''' Merges a failed flush back into the pending deltas so nothing is lost '''
+
+        if not self.flushing:
+            return
+
+        for key, (experience, artificial) in self.inflight_guilds.items():
+            pending = self.guilds.setdefault(key, [0, 0])
+            pending[0] += experience
+            pending[1] += artificial
+
+        for user, experience in self.inflight_users.items():
+            self.users[user] = self.users.get(user, 0) + experience
+
+        self._settle()
+        self.failures += 1
+
+        if self.opened is None:
+            self.opened = time.monotonic()
+
+    def stats(self) -> dict:
+        stats = {
+            "pending": len(self),
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "flushed_rows": self.flushed_rows,
+            "last_batch": self.last_batch,
+            "largest_batch": self.largest_batch,
+            "average_batch": self.flushed_rows / self.flushes if self.flushes else 0.0,
+            "last_latency": self.last_latency,
+            "average_latency": self.total_latency / self.flushes if self.flushes else 0.0,
+            "max_latency": self.max_latency
+        }
+
+        return stats
+
+
+class BatchWindow():
+    ''' Collects Submissions for up to `window` Seconds and Hands them to `flush` as one Batch '''
+
+    def __init__(self, flush: Callable[[List[Any]], Awaitable[List[Any]]], *, window: float, max_batch: int):
+        # Called with the items in order, returning one result per item - an exception in place of a result
+        # fails that item alone, while raising fails the whole batch
+        self.flush = flush
+        self.window = window
+        self.max_batch = max_batch
+
+        self.pending: List[Tuple[Any, asyncio.Future]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+        self.lock = asyncio.Lock()
+        self.running = set()
+
+        self.batches = 0
+        self.failures = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.total_latency = 0.0
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        self.pending.append((item, future))
+
+        if len(self.pending) >= self.max_batch:
+            self._close()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self._close)
+
+        return await future
+
+    def _close(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        if not self.pending:
+            return
+
+        batch, self.pending = self.pending, []
+
+        task = asyncio.ensure_future(self._run(batch))
+        self.running.add(task)
+        task.add_done_callback(self.running.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        # One batch at a time - items arriving during a slow flush simply make the next batch larger
+        async with self.lock:
+            started = time.perf_counter()
+
+            try:
+                results = await self.flush([item for item, _ in batch])
+            except Exception as error:
+                self.failures += 1
+
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                return
+
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+            self.batches += 1
+            self.items += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            self.total_latency += time.perf_counter() - started
+
+    async def drain(self) -> None:
+        ''' Flushes whatever is waiting now and waits for every batch still running '''
+
+        self._close()
+
+        if self.running:
+            await asyncio.gather(*self.running, return_exceptions=True)
+
+    def stats(self) -> dict:
+        stats = {
+            "pending": len(self.pending),
+            "batches": self.batches,
+            "failures": self.failures,
+            "items": self.items,
+            "largest_batch": self.largest_batch,
+            "average_batch": self.items / self.batches if self.batches else 0.0,
+            "average_latency": self.total_latency / self.batches if self.batches else 0.0
+        }
+
+        return stats
@@ -0,0 +1,229 @@
+import time
+
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class LRUCache():
+    ''' Bounded Mapping with Least-Recently-Used Eviction and a per-Entry Time-To-Live '''
+
+    def __init__(self, *, maxsize: int, ttl: Optional[float], version: int = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        # Entries stored under an older version are misses - bumping it retires them all without a clear
+        self.version = version
+
+        # key -> (expires_at, value, version), oldest use first
+        self.entries: OrderedDict = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self.entries.get(key)
+
+        return entry is not None and not self._expired(entry)
+
+    def _expired(self, entry: tuple) -> bool:
+        if entry[2] != self.version:
+            return True
+
+        return entry[0] is not None and entry[0] <= time.monotonic()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self.entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return default
+
+        if self._expired(entry):
+            del self.entries[key]
+            self.expirations += 1
+            self.misses += 1
+
+            return default
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+
+        return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        expires = time.monotonic() + self.ttl if self.ttl else None
+
+        self.entries[key] = (expires, value, self.version)
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def update(self, key: Hashable, value: Any) -> bool:
+        ''' Replaces a live entry without extending its lifetime - returns False if nothing was cached '''
+
+        entry = self.entries.get(key)
+
+        if entry is None or self._expired(entry):
+            return False
+
+        self.entries[key] = (entry[0], value, entry[2])
+
+        return True
+
+    def peek(self, key: Hashable) -> Any:
+        ''' Reads a live entry without touching its recency or the hit/miss counters '''
+
+        entry = self.entries.get(key)
+
+        if entry is None or self._expired(entry):
+            return None
+
+        return entry[1]
+
+    def invalidate(self, key: Hashable) -> None:
+        self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+
+        stats = {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+        return stats
+
+
+class BoostCache():
+    ''' Each User's Boost together with the Experience at which it next Changes '''
+
+    def __init__(self, ladder: Any, *, maxsize: int, ttl: Optional[float], version: int = 0):
+        self.ladder = ladder
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = version
+
+        # user -> (experience, next_bound, boost, version, expires_at) - the ladder is only searched again when a
+        # delta crosses `next_bound` or `rebase` installs a newer ladder. Deltas never extend `expires_at`, so the
+        # tracked experience is re-read from the database at least every `ttl`
+        self.entries: Dict[Hashable, Tuple[int, Optional[int], int, int, Optional[float]]] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._live(key) is not None
+
+    def _live(self, key: Hashable) -> Optional[tuple]:
+        entry = self.entries.get(key)
+
+        if entry is not None and entry[4] is not None and entry[4] <= time.monotonic():
+            del self.entries[key]
+            self.expirations += 1
+
+            return None
+
+        return entry
+
+    def experience(self, key: Hashable) -> Optional[int]:
+        ''' Tracked experience of a live entry, without touching the hit/miss counters '''
+
+        entry = self._live(key)
+
+        return entry[0] if entry is not None else None
+
+    def get(self, key: Hashable) -> Optional[int]:
+        entry = self._live(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        # The experience is still valid under a new ladder - only the boost has to be looked up again
+        if entry[3] != self.version:
+            return self.load(key, entry[0], expires=entry[4])
+
+        return entry[2]
+
+    def load(self, key: Hashable, experience: int, *, expires: Optional[float] = None) -> int:
+        ''' Caches the boost for `experience` - `expires` carries an entry's lifetime over, else it starts afresh '''
+
+        current, following, _ = self.ladder.locate(experience)
+        next_bound = self.ladder.bounds[following] if following is not None else None
+        boost = self.ladder.labels[current]
+
+        if key not in self.entries and len(self.entries) >= self.maxsize:
+            # Oldest entry first - a user evicted while still active is simply loaded again
+            del self.entries[next(iter(self.entries))]
+
+        if expires is None and self.ttl:
+            expires = time.monotonic() + self.ttl
+
+        self.entries[key] = (experience, next_bound, boost, self.version, expires)
+
+        return boost
+
+    def add(self, key: Hashable, amount: int) -> None:
+        entry = self._live(key)
+        if entry is None:
+            return
+
+        experience, next_bound, boost, version, expires = entry
+        experience += amount
+
+        if version != self.version or (next_bound is not None and experience >= next_bound):
+            self.refreshes += 1
+            self.load(key, experience, expires=expires)
+        else:
+            self.entries[key] = (experience, next_bound, boost, version, expires)
+
+    def rebase(self, ladder: Any, *, version: int) -> None:
+        ''' Installs a new ladder - existing entries are re-evaluated lazily on their next use '''
+
+        self.ladder = ladder
+        self.version = version
+
+    def invalidate(self, key: Hashable) -> None:
+        self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+
+        stats = {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "refreshes": self.refreshes,
+            "expirations": self.expirations
+        }
+
+        return stats
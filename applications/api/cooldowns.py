@@ -0,0 +1,79 @@
+import time
+
+from typing import Dict, Optional
+
+
+class CooldownTracker():
+    ''' Per-(Guild, User) Message Cooldowns kept as one Flat Mapping of Ints '''
+
+    # Ticks per second
+    resolution = 10
+
+    def __init__(self, *, cooldown: float, sweep_interval: float):
+        self.cooldown = int(cooldown * self.resolution)
+        self.sweep_interval = int(sweep_interval * self.resolution)
+
+        self.started = time.monotonic()
+        self.next_sweep = self.sweep_interval
+
+        # (guild_id << 64 | user_id) -> expiry tick - one dict slot and two ints per active chatter, with expired
+        # entries dropped in one sweep per interval instead of on every message
+        self.expiries: Dict[int, int] = {}
+
+        self.accepted = 0
+        self.throttled = 0
+        self.swept = 0
+
+    def __len__(self) -> int:
+        return len(self.expiries)
+
+    def _now(self) -> int:
+        return int((time.monotonic() - self.started) * self.resolution)
+
+    @staticmethod
+    def pack(*, guildId: int, userId: int) -> int:
+        return guildId << 64 | userId
+
+    def acquire(self, *, guildId: int, userId: int) -> bool:
+        ''' Starts a new cooldown and returns True, or returns False while one is still running '''
+
+        now = self._now()
+        if now >= self.next_sweep:
+            self.sweep(now)
+
+        key = self.pack(guildId=guildId, userId=userId)
+        expires = self.expiries.get(key)
+
+        if expires is not None and expires > now:
+            self.throttled += 1
+            return False
+
+        self.expiries[key] = now + self.cooldown
+        self.accepted += 1
+
+        return True
+
+    def sweep(self, now: Optional[int] = None) -> int:
+        if now is None:
+            now = self._now()
+
+        tracked = len(self.expiries)
+
+        # Rebuilding is cheaper than deleting in place and gives the dict a chance to shrink
+        self.expiries = {key: expires for key, expires in self.expiries.items() if expires > now}
+        self.next_sweep = now + self.sweep_interval
+
+        removed = tracked - len(self.expiries)
+        self.swept += removed
+
+        return removed
+
+    def stats(self) -> dict:
+        stats = {
+            "tracked": len(self.expiries),
+            "accepted": self.accepted,
+            "throttled": self.throttled,
+            "swept": self.swept
+        }
+
+        return stats
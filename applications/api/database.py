@@ -1,87 +1,313 @@
 import asyncpg
 import asyncio
 
-from typing import Optional, Any, List
+from contextlib import asynccontextmanager
+from typing import Optional, Any, List, Dict, Tuple, AsyncIterator
 
-from ..constants import WebServer
+from ..constants import WebServer, PoolConfig, CursorConfig
+
+
+class PoolExhausted(Exception):
+    def __init__(self, reason: Optional[str]):
+        self.reason = reason
+
+    def __str__(self) -> str:
+        return getattr(self, 'reason', 'Timed Out Waiting for a Database Connection')
+
+
+class StatementNotFound(Exception):
+    def __init__(self, reason: Optional[str]):
+        self.reason = reason
+
+    def __str__(self) -> str:
+        return getattr(self, 'reason', 'No Statement Registered Under That Name')
+
+
+class StatementRegistry():
+    ''' Named Statements, Prepared Once per Pooled Connection '''
+
+    def __init__(self, role: str):
+        self.role = role
+        self.statements: Dict[str, str] = {}
+
+        # Backend pid -> names it has parsed. The prepared handles live in each connection's statement cache
+        # (keyed by SQL text), since pool proxies are recycled on every acquire
+        self.prepared: Dict[int, set] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.executions: Dict[str, int] = {}
+
+    def register(self, statements: Dict[str, str]) -> None:
+        for name, query in statements.items():
+            if self.statements.get(name, query) != query:
+                raise ValueError(f'Statement "{name}" is already registered for "{self.role}" with different SQL')
+
+            self.statements[name] = query
+
+    async def attach(self, connection: asyncpg.Connection) -> None:
+        ''' Pool `init` hook - runs once for every new physical connection '''
+
+        pid = connection.get_server_pid()
+        self.prepared[pid] = set()
+
+        connection.add_termination_listener(lambda _: self.prepared.pop(pid, None))
+
+    def lookup(self, connection: asyncpg.Connection, name: str) -> str:
+        try:
+            query = self.statements[name]
+        except KeyError:
+            raise StatementNotFound(f'No Statement Registered as "{name}" for "{self.role}"')
+
+        seen = self.prepared.setdefault(connection.get_server_pid(), set())
+
+        if name in seen:
+            self.hits += 1
+        else:
+            self.misses += 1
+            seen.add(name)
+
+        self.executions[name] = self.executions.get(name, 0) + 1
+
+        return query
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "executions": dict(sorted(self.executions.items(), key=lambda item: item[1], reverse=True))
+        }
+
+        return stats
+
+
+class PoolManager():
+    ''' Process-Wide Registry of Connection Pools (one per Database Role) '''
+
+    pools: Dict[str, asyncpg.pool.Pool] = {}
+    locks: Dict[str, asyncio.Lock] = {}
+    registries: Dict[str, StatementRegistry] = {}
+
+    monitor: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def get_pool(cls, role: str, log: Optional[Any]) -> asyncpg.pool.Pool:
+        if role in cls.pools:
+            return cls.pools[role]
+
+        # Concurrent first-time callers wait on the same pool instead of racing to create their own
+        lock = cls.locks.setdefault(role, asyncio.Lock())
+        async with lock:
+            if role not in cls.pools:
+                cls.pools[role] = await asyncpg.create_pool(
+                    user = role,
+                    password = role,
+                    database = WebServer.database,
+
+                    host = WebServer.address,
+                    port = WebServer.port,
+
+                    min_size = PoolConfig.min_size,
+                    max_size = PoolConfig.max_size,
+                    max_queries = PoolConfig.max_queries,
+                    max_inactive_connection_lifetime = PoolConfig.idle_lifetime,
+                    statement_cache_size = PoolConfig.statement_cache,
+
+                    init = cls.registry(role).attach
+                )
+                if log:
+                    sizes = f'{PoolConfig.min_size}-{PoolConfig.max_size}'
+                    log.info('database', f'Opened Connection Pool for "{role}" ({sizes})')
+
+        if cls.monitor is None or cls.monitor.done():
+            cls.monitor = asyncio.ensure_future(cls.monitor_health(log))
+
+        return cls.pools[role]
+
+    @classmethod
+    def registry(cls, role: str) -> StatementRegistry:
+        if role not in cls.registries:
+            cls.registries[role] = StatementRegistry(role)
+
+        return cls.registries[role]
+
+    @classmethod
+    async def check_health(cls, log: Optional[Any]) -> Dict[str, bool]:
+        status = {}
+
+        for role, pool in list(cls.pools.items()):
+            try:
+                async with pool.acquire(timeout=PoolConfig.acquire_timeout) as connection:
+                    await connection.fetchval('SELECT 1')
+            except (asyncio.TimeoutError, OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as error:
+                # Recycle every connection so the next borrower reconnects instead of inheriting a dead socket
+                pool.expire_connections()
+                status[role] = False
+
+                if log:
+                    log.warn('database', f'Health Check Failed for "{role}" - {error}')
+            else:
+                status[role] = True
+
+        return status
+
+    @classmethod
+    async def monitor_health(cls, log: Optional[Any]) -> None:
+        while cls.pools:
+            await asyncio.sleep(PoolConfig.health_interval)
+            await cls.check_health(log)
+
+    @classmethod
+    async def close_all(cls) -> None:
+        if cls.monitor:
+            cls.monitor.cancel()
+            cls.monitor = None
+
+        for role in list(cls.pools):
+            pool = cls.pools.pop(role)
+            await pool.close()
 
 
 class Connector():
     ''' An Asynchronous Connection Handler for PostgreSQL '''
 
+    # Subclasses declare their hot queries here as {name: sql}, then call them through `fetchnamed` & co.
+    statements: Dict[str, str] = {}
+
     def __init__(self, child: str, log: Optional[Any]):
         self.log = log
         self.child = child
         self.database = None
 
+        self.registry = PoolManager.registry(child)
+        for klass in reversed(type(self).__mro__):
+            self.registry.register(vars(klass).get('statements', {}))
+
     async def load_connection(self) -> None:
-        self.database = await asyncpg.connect(
-            user = self.child,
-            password = self.child,
-            database = WebServer.database,
-
-            host = WebServer.address,
-            port = WebServer.port
-        )
-        if self.log:
-            self.log.info('database', f'Logged into Database as "{self.child}"')
+        self.database = await PoolManager.get_pool(self.child, self.log)
 
+        if self.log:
+            self.log.trace('database', f'Borrowing from Connection Pool as "{self.child}"')
 
-    # Region: Interface Functions
+    @asynccontextmanager
+    async def connect(self) -> AsyncIterator[asyncpg.Connection]:
+        ''' A pooled connection - only waiting for one is reported as PoolExhausted, query timeouts pass through '''
 
-    async def fetchone(self, query: str, args: Optional[tuple]) -> Optional[asyncpg.Record]:
         if not self.database:
             await self.load_connection()
 
-        row = await self.database.fetchrow(query, *args)
-        return row
+        try:
+            connection = await self.database.acquire(timeout=PoolConfig.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise PoolExhausted(f'No Connection Available for "{self.child}" within {PoolConfig.acquire_timeout}s')
 
-    async def fetchmany(self, query: str, args: Optional[tuple], *, limit: Optional[int]) -> List[asyncpg.Record]:
-        if not self.database:
-            await self.load_connection()
+        try:
+            yield connection
+        finally:
+            await self.database.release(connection)
+
+    async def borrow(self, operation: str, *args, **kwargs) -> Any:
+        ''' Runs a single Connection method against a pooled connection '''
+
+        async with self.connect() as connection:
+            return await getattr(connection, operation)(*args, **kwargs)
+
+    async def run_statement(self, name: str, args: tuple, *, operation: str) -> Any:
+        async with self.connect() as connection:
+            query = self.registry.lookup(connection, name)
+
+            return await getattr(connection, operation)(query, *args)
+
+    def statement_stats(self) -> dict:
+        return self.registry.stats()
+
+    @staticmethod
+    def paginate(query: str, args: tuple, *, limit: Optional[int], offset: int = 0) -> Tuple[str, tuple]:
+        ''' Appends parameterized LIMIT/OFFSET clauses so the server, not Python, trims the result set '''
+
+        query = query.strip().rstrip(';')
+        args = tuple(args)
 
-        rows = await self.database.fetch(query, *args)
         if limit:
-            return rows[:limit]
+            args += (limit, )
+            query += f' LIMIT ${len(args)}'
+
+        if offset:
+            args += (offset, )
+            query += f' OFFSET ${len(args)}'
+
+        return query, args
+
+
+    # Region: Interface Functions
 
+    async def fetchone(self, query: str, args: Optional[tuple]) -> Optional[asyncpg.Record]:
+        row = await self.borrow('fetchrow', query, *args)
+        return row
+
+    async def fetchmany(self, query: str, args: Optional[tuple], *, limit: Optional[int],
+                        offset: int = 0) -> List[asyncpg.Record]:
+        query, args = self.paginate(query, args or (), limit=limit, offset=offset)
+
+        rows = await self.borrow('fetch', query, *args)
         return rows
 
     async def fetchall(self, query: str, args: Optional[tuple]) -> List[asyncpg.Record]:
-        if not self.database:
-            await self.load_connection()
-
-        rows = await self.database.fetch(query, *args)
+        rows = await self.borrow('fetch', query, *args)
         return rows
 
     async def insertone(self, statement: str, args: tuple) -> bool:
-        if not self.database:
-            await self.load_connection()
-
-        operation = await self.database.execute(statement, *args)
+        operation = await self.borrow('execute', statement, *args)
         status = bool(int(operation[-1:]))
 
         return status
 
     async def insertmany(self, table: str, args: List[tuple]) -> int:
-        if not self.database:
-            await self.load_connection()
-
-        operation = await self.database.copy_records_to_table(table, records=args)
-        status = int(operation[-1:])
+        operation = await self.borrow('copy_records_to_table', table, records=args)
+        status = int(operation.split()[-1])
 
         return status
 
     async def executeone(self, query: str, args: tuple) -> int:
-        if not self.database:
-            await self.load_connection()
-
-        operation = await self.database.execute(query, *args)
+        operation = await self.borrow('execute', query, *args)
         status = bool(int(operation[-1:]))
 
         return status
 
     async def executemany(self, statement: str, args: List[tuple]) -> None:
-        if not self.database:
-            await self.load_connection()
+        return await self.borrow('executemany', statement, args)
+
+    @asynccontextmanager
+    async def stream(self, query: str, args: Optional[tuple], *,
+                     prefetch: Optional[int] = None) -> AsyncIterator[AsyncIterator[asyncpg.Record]]:
+        ''' Server-side cursor holding at most `prefetch` rows at once - `async with self.stream(...) as records` '''
+
+        # Leaving the block closes the cursor and releases the connection, even when iteration stopped early
+        async with self.connect() as connection:
+            # Cursors only live inside a transaction; repeatable read keeps long exports on one snapshot
+            async with connection.transaction(isolation='repeatable_read', readonly=True):
+                yield connection.cursor(query, *(args or ()), prefetch=prefetch or CursorConfig.prefetch)
+
+    # End Region
+
+    # Region: Named Statement Functions
+
+    async def fetchnamed(self, name: str, args: tuple) -> Optional[asyncpg.Record]:
+        row = await self.run_statement(name, args, operation='fetchrow')
+        return row
+
+    async def fetchallnamed(self, name: str, args: tuple) -> List[asyncpg.Record]:
+        rows = await self.run_statement(name, args, operation='fetch')
+        return rows
+
+    async def executenamed(self, name: str, args: tuple) -> bool:
+        operation = await self.run_statement(name, args, operation='execute')
+        status = bool(int(operation.split()[-1]))
+
+        return status
 
-        return await self.database.executemany(statement, args)
+    async def executemanynamed(self, name: str, args: List[tuple]) -> None:
+        return await self.run_statement(name, (args, ), operation='executemany')
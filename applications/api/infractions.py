@@ -1,10 +1,16 @@
 import json
+import asyncpg
 
+from datetime import datetime
 from discord import Member, User, Embed
-from typing import Union, Optional, List, Any
+from typing import Union, Optional, List, Dict, Tuple, Any
 
 from . import database
-from ..constants import EventConfig
+from .cache import LRUCache
+from .buffers import BatchWindow
+from .records import InfractionRecord, pack, render_report
+from .partitions import PartitionDirectory, load_directory, latest
+from ..constants import InfractionCacheConfig, EventBatchConfig
 
 
 class InfractionNotFound(Exception):
@@ -15,62 +21,191 @@ class InfractionNotFound(Exception):
         return getattr(self, 'reason', 'Unable To Locate Infraction Specified')
 
 
+class InfractionPage():
+    ''' One Keyset Page of Infraction History - `cursor` is `(created_at, event_id)`, None on the last page '''
+
+    __slots__ = ('entries', 'cursor')
+
+    def __init__(self, entries: List[InfractionRecord], *, cursor: Optional[Tuple[datetime, int]]):
+        self.entries = entries
+        self.cursor = cursor
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+
 class API(database.Connector):
     ''' Tracks and Reports Events in the Server '''
 
+    statements = {
+        # The counter moves in the same statement as the event, so the two can never disagree
+        "store_event": (
+            'WITH stored AS ('
+            'INSERT INTO infractions (guild_id, user_id, event_type, moderator_id, payload) '
+            'VALUES ($1, $2, $3, $4, $5) RETURNING event_id, guild_id, user_id, event_type'
+            '), counted AS ('
+            'INSERT INTO infraction_counters (user_id, guild_id, event_type, total) '
+            'SELECT user_id, guild_id, event_type, 1 FROM stored '
+            'ON CONFLICT (user_id, guild_id, event_type) DO UPDATE SET total = infraction_counters.total + 1'
+            ') SELECT event_id FROM stored'
+        ),
+
+        # Batched writes - ids are handed out up front so the rows can be COPYed with them
+        "reserve_events": (
+            'SELECT nextval(pg_get_serial_sequence(\'infractions\', \'event_id\')) AS event_id '
+            'FROM generate_series(1, $1)'
+        ),
+        "count_events": (
+            'INSERT INTO infraction_counters (user_id, guild_id, event_type, total) '
+            'SELECT user_id, guild_id, event_type, count(*) FROM unnest($1::bigint[], $2::bigint[], $3::text[]) '
+            'AS events (user_id, guild_id, event_type) GROUP BY 1, 2, 3 '
+            'ON CONFLICT (user_id, guild_id, event_type) DO UPDATE '
+            'SET total = infraction_counters.total + EXCLUDED.total'
+        ),
+
+        "fetch_infraction": (
+            'SELECT event_id, guild_id, user_id, event_type, moderator_id, created_at, payload, embed '
+            'FROM infractions WHERE event_id = $1 AND created_at >= $2 AND created_at < $3'
+        ),
+        "remove_infraction": (
+            'WITH removed AS ('
+            'DELETE FROM infractions WHERE event_id = $1 AND created_at >= $2 AND created_at < $3 '
+            'RETURNING event_id, guild_id, user_id, event_type'
+            '), counted AS ('
+            'UPDATE infraction_counters AS counters SET total = counters.total - 1 FROM removed '
+            'WHERE counters.user_id = removed.user_id AND counters.guild_id = removed.guild_id '
+            'AND counters.event_type = removed.event_type'
+            ') SELECT event_id FROM removed'
+        ),
+
+        # Keyset pages on (created_at, event_id) - the cursor is the last row already shown, so no page re-reads
+        # the ones before it. The plain created_at bound is what lets the planner skip months newer than the cursor
+        "fetch_history": (
+            'SELECT event_id, guild_id, user_id, event_type, moderator_id, created_at, payload, embed '
+            'FROM infractions WHERE user_id = $1 AND created_at <= $2 AND (created_at, event_id) < ($2, $3) '
+            'ORDER BY created_at DESC, event_id DESC LIMIT $4'
+        ),
+        "fetch_guild_history": (
+            'SELECT event_id, guild_id, user_id, event_type, moderator_id, created_at, payload, embed '
+            'FROM infractions WHERE user_id = $1 AND guild_id = $2 '
+            'AND created_at <= $3 AND (created_at, event_id) < ($3, $4) '
+            'ORDER BY created_at DESC, event_id DESC LIMIT $5'
+        ),
+
+        "fetch_summary": (
+            'SELECT event_type, sum(total)::bigint AS total FROM infraction_counters '
+            'WHERE user_id = $1 AND total > 0 GROUP BY event_type'
+        ),
+        "fetch_guild_summary": (
+            'SELECT event_type, total::bigint AS total FROM infraction_counters '
+            'WHERE user_id = $1 AND guild_id = $2 AND total > 0'
+        ),
+
+        "fetch_legacy": (
+            'SELECT event_id, embed FROM infractions WHERE payload IS NULL AND event_id > $1 '
+            'ORDER BY event_id LIMIT $2'
+        ),
+        "compact_legacy": 'UPDATE infractions SET payload = $2, embed = NULL WHERE event_id = $1'
+    }
+
+    # Cursor for a first page - larger than any event_id the sequence will hand out
+    newest = 2 ** 63 - 1
+
     def __init__(self, log: Any):
         self.log = log
 
+        # Decoded records by event_id - incidents keep re-reading the same few cases
+        self.cases = LRUCache(maxsize=InfractionCacheConfig.maxsize, ttl=InfractionCacheConfig.ttl)
+
+        # Raids and mass bans arrive as bursts - events landing in the same window share one COPY
+        self.event_batch = BatchWindow(
+            self.store_events,
+            window = EventBatchConfig.window,
+            max_batch = EventBatchConfig.max_batch
+        )
+
+        # Which month each event id can live in - loaded on first use
+        self.partitions: Optional[PartitionDirectory] = None
+
         super().__init__('infraction-api', log)
 
     @staticmethod
     def build_embed(event: str, details: dict) -> Embed:
-        color = getattr(EventConfig, event, 0x00ff00)
-        event = event.replace('_', ' ').title()
-
-        if not details["Moderator"]:
-            moderator = 'None'
-        else:
-            moderator = details["Moderator"].mention
-
-        embed = Embed(
-            title = f'Event Logging --> {event}',
-            color = color,
-            description = (
-                f'A __{event}__ Event was triggered by: {details["User"].mention} \n\n'
-                f'Moderator Influence: {moderator}\n'
-                f'Event Duration: {details["Duration"]}\n\n'
-                f'Event Details: \n{details["Reason"]}'
-            )
+        embed = render_report(
+            event,
+            user = details["User"].mention,
+            moderator = details["Moderator"].mention if details["Moderator"] else None,
+            duration = details["Duration"],
+            reason = details["Reason"]
         )
 
         return embed
 
-    async def store_event(self, event: tuple) -> bool:
-        statement = 'INSERT INTO infractions (guild_id, user_id, event_type, embed) VALUES ($1, $2, $3, $4)'
-        status = await super().insertone(statement, *event)
+    async def store_event(self, event: tuple) -> Optional[int]:
+        result = await super().fetchnamed('store_event', event)
+
+        return result['event_id'] if result else None
 
-        return status
+    async def store_events(self, events: List[tuple]) -> List[int]:
+        ''' Stores a batch of `store_event` tuples with one COPY - returns their event ids, in order '''
+
+        columns = ('event_id', 'guild_id', 'user_id', 'event_type', 'moderator_id', 'payload')
+
+        async with super().connect() as connection:
+            reserved = await connection.fetch(self.registry.lookup(connection, 'reserve_events'), len(events))
+            ids = sorted(record['event_id'] for record in reserved)
+
+            async with connection.transaction():
+                await connection.copy_records_to_table(
+                    'infractions',
+                    records = [(event_id, *event) for event_id, event in zip(ids, events)],
+                    columns = columns
+                )
+                await connection.execute(
+                    self.registry.lookup(connection, 'count_events'),
+                    [event[1] for event in events],
+                    [event[0] for event in events],
+                    [event[2] for event in events]
+                )
+
+        self.log.trace('infractions', f'Stored {len(events)} Infractions in one Batch')
+
+        return ids
 
     async def log_infraction(self, event: str, details: Union[Embed, dict]) -> Embed:
         if not isinstance(details, Embed):
             report = self.build_embed(event, details)
+
+            # Only what the template cannot rebuild is stored - the rest comes back from the columns
+            payload = pack({"duration": str(details["Duration"]), "reason": details["Reason"]})
         else:
             report = details
+            payload = pack({"embed": report.to_dict()})
 
         try:
             guild = details["User"].guild.id
         except AttributeError:
             guild = details["Guild"].id
 
+        moderator = details["Moderator"].id if details["Moderator"] else None
+
         args = (
             guild,
             details["User"].id,
             event,
-            json.dumps(report.to_dict())
+            moderator,
+            payload
         )
 
-        saved = await self.store_event(args)
+        try:
+            saved = await self.event_batch.submit(args)
+        except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, database.PoolExhausted) as error:
+            self.log.error('infractions', f'Infraction Batch Failed to Commit - {error}')
+            saved = None
+
         if saved:
             report.description += '\n\n*Event Successfully Committed To Database*'
             self.log.trace('infractions', f'An Infraction has been placed against {args[1]}')
@@ -88,46 +223,128 @@ class API(database.Connector):
 
         return report
 
-    async def fetch_infraction(self, *, id: int) -> Embed:
-        query = 'SELECT embed FROM infractions WHERE event_id = $1'
-        args = (id, )
+    # Region: Partitions
+
+    async def refresh_partitions(self) -> PartitionDirectory:
+        async with super().connect() as connection:
+            self.partitions = await load_directory(connection)
+
+        return self.partitions
+
+    async def partition_bounds(self, event_id: int) -> tuple:
+        ''' created_at range holding `event_id` - lets the planner skip every other month '''
+
+        if self.partitions is None:
+            await self.refresh_partitions()
 
-        result = await super().fetchone(query, args)
+        return self.partitions.bounds(event_id)
+
+    # End Region
+
+    async def fetch_record(self, *, id: int) -> InfractionRecord:
+        cached = self.cases.get(id)
+        if cached is not None:
+            return cached
+
+        args = (id, *await self.partition_bounds(id))
+
+        result = await super().fetchnamed('fetch_infraction', args)
 
         if result:
-            embed_data = json.loads(result['embed'])
-            embed = Embed.from_dict(embed_data)
+            record = InfractionRecord.from_record(result)
+            self.cases.put(id, record)
 
-            return embed
+            return record
 
         else:
-            raise InfractionNotFound()
+            raise InfractionNotFound(f'No Infraction Recorded as Case #{id}')
 
-    async def fetch_records(self, *, user_id: int, guild_id: Optional[int]) -> List[int]:
+    async def fetch_infraction(self, *, id: int) -> Embed:
+        record = await self.fetch_record(id=id)
+
+        return record.embed()
+
+    async def fetch_history(self, *, user_id: int, guild_id: Optional[int] = None,
+                            before: Optional[Tuple[datetime, int]] = None, limit: int = 10) -> InfractionPage:
+        ''' One page of a user's infractions, newest first - pass the returned `cursor` as `before` for the next '''
+
+        created_at, event_id = before or (latest, self.newest)
+
+        # One extra row tells whether another page exists without a second query
         if guild_id:
-            query = 'SELECT event_id FROM infractions WHERE user_id = $1 AND guild_id = $2'
-            args = (user_id, guild_id)
+            args = (user_id, guild_id, created_at, event_id, limit + 1)
+            results = await super().fetchallnamed('fetch_guild_history', args)
         else:
-            query = 'SELECT event_id FROM infractions WHERE user_id = $1'
-            args = (user_id, )
+            results = await super().fetchallnamed('fetch_history', (user_id, created_at, event_id, limit + 1))
 
-        results = await super().fetchmany(query, args, limit=10)
+        entries = [InfractionRecord.from_record(record) for record in results[:limit]]
+        following = (entries[-1].created_at, entries[-1].event_id) if len(results) > limit else None
 
-        if results:
-            case_ids = [record['event_id'] for record in results]
+        return InfractionPage(entries, cursor=following)
+
+    async def fetch_records(self, *, user_id: int, guild_id: Optional[int]) -> List[int]:
+        page = await self.fetch_history(user_id=user_id, guild_id=guild_id)
+
+        if page.entries:
+            case_ids = [entry.event_id for entry in page.entries]
 
             return case_ids
 
         else:
             raise InfractionNotFound('User does not have infractions')
 
-    async def remove_infraction(self, *, id: int) -> None:
-        query = 'DELETE FROM infractions WHERE event_id = $1'
-        args = (id, )
+    async def fetch_summary(self, *, user_id: int, guild_id: Optional[int] = None) -> Dict[str, int]:
+        ''' Infraction totals by event type, read from the counters instead of counting the history '''
 
-        removed = await super().executeone(query, args)
+        if guild_id:
+            results = await super().fetchallnamed('fetch_guild_summary', (user_id, guild_id))
+        else:
+            results = await super().fetchallnamed('fetch_summary', (user_id, ))
+
+        return {record['event_type']: record['total'] for record in results}
+
+    async def remove_infraction(self, *, id: int) -> bool:
+        args = (id, *await self.partition_bounds(id))
+
+        removed = await super().fetchnamed('remove_infraction', args)
+        self.cases.invalidate(id)
 
         if not removed:
-            raise InfractionNotFound()
+            raise InfractionNotFound(f'No Infraction Recorded as Case #{id}')
+
+        return True
+
+    def batch_stats(self) -> dict:
+        stats = {
+            "events": self.event_batch.stats()
+        }
+
+        return stats
+
+    def cache_stats(self) -> dict:
+        stats = {
+            "cases": self.cases.stats()
+        }
+
+        return stats
+
+    async def compact_legacy(self, *, chunk_size: int = 5000) -> int:
+        ''' Rewrites rows stored as full embed JSON into compressed payloads - returns how many moved '''
+
+        compacted, last = 0, 0
+
+        while True:
+            rows = await super().fetchallnamed('fetch_legacy', (last, chunk_size))
+            if not rows:
+                break
+
+            updates = [(row['event_id'], pack({"embed": json.loads(row['embed'])})) for row in rows]
+            await super().executemanynamed('compact_legacy', updates)
+
+            compacted += len(rows)
+            last = rows[-1]['event_id']
+
+        if compacted:
+            self.log.info('infractions', f'Compacted {compacted} Legacy Infraction Embeds')
 
-        return removed
+        return compacted
@@ -0,0 +1,50 @@
+import json
+import time
+
+from asyncpg import Record
+from datetime import datetime, timezone
+from typing import List, Tuple, Optional
+
+
+# Scope of the global leaderboard - guild snapshots use the guild id
+GLOBAL_SCOPE = 0
+
+
+class LeaderboardSnapshot():
+    ''' Top Members of one Guild (or the Global Ranking) as they Stood at `taken_at` '''
+
+    __slots__ = ('scope', 'entries', 'taken_at')
+
+    def __init__(self, scope: int, entries: List[Tuple[int, int]], *, taken_at: Optional[float] = None):
+        self.scope = scope
+        self.entries = [tuple(entry) for entry in entries]
+        self.taken_at = taken_at if taken_at is not None else time.time()
+
+    @classmethod
+    def from_record(cls, record: Record) -> 'LeaderboardSnapshot':
+        return cls(record['scope'], json.loads(record['entries']), taken_at=record['taken_at'].timestamp())
+
+    @property
+    def age(self) -> float:
+        return max(time.time() - self.taken_at, 0.0)
+
+    @property
+    def timestamp(self) -> datetime:
+        return datetime.fromtimestamp(self.taken_at, timezone.utc)
+
+    def to_record(self) -> tuple:
+        return (self.scope, json.dumps(self.entries), self.timestamp)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __str__(self):
+        scope = 'Global' if self.scope == GLOBAL_SCOPE else f'Guild ID: {self.scope}'
+
+        return f'{scope} - Entries: {len(self.entries)} - Age: {self.age:.0f}s'
+
+    def __repr__(self):
+        return self.__str__()
@@ -1,14 +1,34 @@
 import json
-
+import time
+import asyncio
+import inspect
+
+from bisect import bisect_right
+from datetime import datetime, timezone, timedelta
+from operator import attrgetter
+from itertools import islice
+from asyncpg import Record
 from discord import Member
-from os.path import exists, abspath
-from typing import Union, Optional, Any, List
+from typing import Union, Optional, Any, List, Dict, Tuple, Callable
 
 from . import database
 from . import ConfigurationError
+from .buffers import ExperienceBuffer
+from .cache import LRUCache, BoostCache
+from .ranking import RankIndex
+from .progression import ProgressionTable
+from .onboarding import OnboardingProgress
+from .cooldowns import CooldownTracker
+from .leaderboards import LeaderboardSnapshot, GLOBAL_SCOPE
+from .sketches import ExperienceHistogram
+from .maintenance import JobProgress, MaintenanceJob, SeasonalReset, InactivityDecay
+from .backup import LevelBackup
 
 from ..constants import Boosts, Leagues
 from ..constants import Levels, Prestiges
+from ..constants import BufferConfig, ProfileCacheConfig, OnboardingConfig, MessageConfig
+from ..constants import LeaderboardConfig, RankingConfig
+from ..constants import HistoryConfig, MaintenanceConfig, BackupConfig, CursorConfig
 
 
 # Custom Exceptions
@@ -39,21 +59,47 @@ class GlobalPermissionsError(Exception):
 
 # Data Containers
 
+class Statistic(object):
+    __slots__ = ('current', 'next', 'remaining')
+
+    def __init__(self, *, current: Any = None, next: Any = None, remaining: Any = None):
+        self.current = current
+        self.next = next
+        self.remaining = remaining
+
+    def __str__(self):
+        message = (
+            f'Current: {self.current} - Next: {self.next} - '
+            f'Remaining: {self.remaining}'
+        )
+
+        return message
+
+    def __repr__(self):
+        return self.__str__()
+
+
 class GuildUser():
-    def __init__(self, guild: int, **kwargs):
+    __slots__ = ('guild_id', 'user_id', 'experience', 'artificial', 'prestige', 'level')
+
+    def __init__(self, guild: int, *, user_id: int, experience: int, artificial: int = 0,
+                 prestige: Optional[Statistic] = None, level: Optional[Statistic] = None):
         self.guild_id = guild
+        self.user_id = user_id
+        self.experience = experience
+        self.artificial = artificial
 
-        for attribute in kwargs:
-            setattr(self, attribute, kwargs[attribute])
+        self.prestige = prestige
+        self.level = level
 
     def __str__(self):
-        try:
+        if self.prestige is not None and self.level is not None:
             message = (
                 f'User ID: {self.user_id} - Guild ID: {self.guild_id} - '
                 f'Prestige: {self.prestige.current} - Level: {self.level.current} - '
                 f'Current Experience: {self.experience}'
             )
-        except AttributeError:
+        else:
             message = (
                 f'User ID: {self.user_id} - Guild ID: {self.guild_id} - '
                 f'Experience: {self.experience}'
@@ -66,36 +112,50 @@ class GuildUser():
 
 
 class GlobalUser():
-    def __init__(self, **kwargs):
-        for attribute in kwargs:
-            setattr(self, attribute, kwargs[attribute])
+    __slots__ = ('user_id', 'experience', 'league', 'boost')
+
+    def __init__(self, *, user_id: int, experience: int,
+                 league: Optional[Statistic] = None, boost: Optional[Statistic] = None):
+        self.user_id = user_id
+        self.experience = experience
+
+        self.league = league
+        self.boost = boost
 
     def __str__(self):
-        try:
+        if self.league is not None and self.boost is not None:
             message = (
                 f'User ID: {self.user_id} - League: {self.league.current} - '
                 f'Boost Increment: {self.boost.current} - '
                 f'Current Experience: {self.experience}'
             )
-        except AttributeError:
+        else:
             message = f'User ID: {self.user_id} - Current Experience: {self.experience}'
 
         return message
 
+    def __repr__(self):
+        return self.__str__()
+
 
-class Statistic(object):
-    def __init__(self, **kwargs):
-        if kwargs:
-            for attribute in kwargs:
-                setattr(self, attribute, kwargs[attribute])
+class GlobalStanding():
+    ''' Global Position of a User - exact inside the top `RankingConfig.exact_top`, estimated below it '''
+
+    __slots__ = ('user_id', 'rank', 'percentile', 'exact', 'error')
+
+    def __init__(self, *, user_id: int, rank: int, percentile: float, exact: bool, error: int = 0):
+        self.user_id = user_id
+        self.rank = rank
+        self.percentile = percentile
+        self.exact = exact
+
+        # Worst-case distance from the exact rank (always 0 when exact)
+        self.error = error
 
     def __str__(self):
-        message = (
-            f'Current: {self.current} - Next: {self.next} - '
-            f'Remaining: {self.remaining}'
-        )
+        position = f'#{self.rank}' if self.exact else f'~#{self.rank} (+/- {self.error})'
 
-        return message
+        return f'User ID: {self.user_id} - Rank: {position} - Top {self.percentile:.2f}%'
 
     def __repr__(self):
         return self.__str__()
@@ -106,9 +166,120 @@ class Statistic(object):
 class API(database.Connector):
     ''' Class to Handle Conversion and Migration of Data between Discord & PostgreSQL '''
 
+    statements = {
+        "fetch_config": 'SELECT settings FROM configs WHERE name = $1',
+
+        "fetch_guild_user": 'SELECT * FROM guild_levels WHERE guild_id = $1 AND user_id = $2',
+        "fetch_global_user": 'SELECT * FROM user_levels WHERE user_id = $1',
+        "fetch_experience": 'SELECT experience FROM user_levels WHERE user_id = $1',
+
+        "insert_guild_user": (
+            'INSERT INTO guild_levels (guild_id, user_id, experience, artificial) VALUES ($1, $2, 0, 0) '
+            'ON CONFLICT (guild_id, user_id) DO NOTHING RETURNING user_id'
+        ),
+        "insert_global_user": (
+            'INSERT INTO user_levels (user_id, experience) VALUES ($1, 0) '
+            'ON CONFLICT (user_id) DO NOTHING RETURNING user_id'
+        ),
+
+        # `xmax` is only set on a row version written by the conflict branch
+        "overwrite_guild_user": (
+            'INSERT INTO guild_levels (guild_id, user_id, experience, artificial) VALUES ($1, $2, $3, $4) '
+            'ON CONFLICT (guild_id, user_id) DO UPDATE '
+            'SET experience = EXCLUDED.experience, artificial = EXCLUDED.artificial '
+            'RETURNING xmax <> 0 AS overwritten'
+        ),
+        "overwrite_global_user": (
+            'INSERT INTO user_levels (user_id, experience) VALUES ($1, $2) '
+            'ON CONFLICT (user_id) DO UPDATE SET experience = EXCLUDED.experience '
+            'RETURNING xmax <> 0 AS overwritten'
+        ),
+
+        "fetch_guild_leaderboard": (
+            'SELECT user_id, experience FROM guild_levels WHERE guild_id = $1 '
+            'ORDER BY experience DESC, user_id LIMIT $2'
+        ),
+        "fetch_global_leaderboard": (
+            'SELECT user_id, experience FROM user_levels '
+            'ORDER BY experience DESC, user_id LIMIT $1'
+        ),
+        "fetch_global_histogram": (
+            'SELECT width_bucket(experience, $1::bigint[]) AS bucket, count(*) AS members '
+            'FROM user_levels GROUP BY 1'
+        ),
+
+        # Both granularities are read together - compaction moves a row from one to the other, never copies it
+        "fetch_top_gainers": (
+            'SELECT user_id, sum(experience)::bigint AS gained FROM ('
+            'SELECT user_id, experience FROM xp_history_hourly WHERE guild_id = $1 AND bucket >= $2 '
+            'UNION ALL '
+            'SELECT user_id, experience FROM xp_history_daily WHERE guild_id = $1 AND bucket >= $2'
+            ') AS history GROUP BY user_id ORDER BY gained DESC, user_id LIMIT $3'
+        ),
+        "fetch_user_gains": (
+            'SELECT coalesce(sum(experience), 0)::bigint AS gained FROM ('
+            'SELECT experience FROM xp_history_hourly WHERE guild_id = $1 AND user_id = $2 AND bucket >= $3 '
+            'UNION ALL '
+            'SELECT experience FROM xp_history_daily WHERE guild_id = $1 AND user_id = $2 AND bucket >= $3'
+            ') AS history'
+        ),
+        "compact_history": (
+            'WITH moved AS ('
+            'DELETE FROM xp_history_hourly WHERE bucket < $1 RETURNING guild_id, user_id, bucket, experience'
+            ') INSERT INTO xp_history_daily (guild_id, user_id, bucket, experience) '
+            'SELECT guild_id, user_id, date_trunc(\'day\', bucket, \'UTC\'), sum(experience) '
+            'FROM moved GROUP BY 1, 2, 3 '
+            'ON CONFLICT (guild_id, bucket, user_id) DO UPDATE '
+            'SET experience = xp_history_daily.experience + EXCLUDED.experience'
+        ),
+        "expire_history": 'DELETE FROM xp_history_daily WHERE bucket < $1',
+
+        "drop_guild_snapshots": 'DELETE FROM leaderboard_snapshots WHERE scope = coalesce($1, scope) AND scope <> 0',
+
+        "fetch_snapshot": 'SELECT scope, entries, taken_at FROM leaderboard_snapshots WHERE scope = $1',
+        "store_snapshot": (
+            'INSERT INTO leaderboard_snapshots (scope, entries, taken_at) VALUES ($1, $2, $3) '
+            'ON CONFLICT (scope) DO UPDATE SET entries = EXCLUDED.entries, taken_at = EXCLUDED.taken_at'
+        )
+    }
+
     def __init__(self, log: Any):
         self.log = log
         self.api_config = None
+        self.progression = None
+
+        self.experience_buffer = ExperienceBuffer(
+            max_pending = BufferConfig.max_pending,
+            flush_interval = BufferConfig.flush_interval
+        )
+        self.flush_lock = asyncio.Lock()
+        self.flusher = None
+
+        # Guild indexes are rebuilt on demand, so the least recently read ones can simply be dropped
+        self.guild_ranks = LRUCache(maxsize=RankingConfig.guild_indexes, ttl=None)
+        self.global_ranks: Optional[RankIndex] = None
+
+        # Guilds whose index is being warmed -> deltas arriving meanwhile, one mapping per warm in progress
+        self.warming: Dict[int, List[Dict[int, int]]] = {}
+
+        # Changes the sketch could not place (the user's previous total was unknown) since it was warmed
+        self.global_sketch: Optional[ExperienceHistogram] = None
+        self.sketch_drift = 0
+
+        self.onboarding: Dict[int, OnboardingProgress] = {}
+        self.maintenance: Dict[Tuple[str, Optional[int]], JobProgress] = {}
+
+        # Scopes (guild ids, or GLOBAL_SCOPE) whose experience changed since their last snapshot
+        self.leaderboards: Dict[int, LeaderboardSnapshot] = {}
+        self.stale_leaderboards = set()
+
+        self.guild_profiles = LRUCache(maxsize=ProfileCacheConfig.maxsize, ttl=ProfileCacheConfig.ttl)
+        self.global_profiles = LRUCache(maxsize=ProfileCacheConfig.maxsize, ttl=ProfileCacheConfig.ttl)
+
+        self.boosts: Optional[BoostCache] = None
+        self.boost_lookups = set()
+
+        self.cooldowns = CooldownTracker(cooldown=MessageConfig.cooldown, sweep_interval=MessageConfig.sweep_interval)
 
         super().__init__('leveling-api', log)
 
@@ -136,30 +307,76 @@ class API(database.Connector):
 
         return config
 
-    async def update_config(self):
-        query = 'SELECT settings FROM configs WHERE name = $1'
+    async def load_config(self) -> dict:
         args = ('leveling-api', )
 
-        raw_config = await super().fetchone(query, args)
+        raw_config = await super().fetchnamed('fetch_config', args)
 
         try:
-            self.api_config = json.loads(raw_config["settings"])
+            config = json.loads(raw_config["settings"])
             self.log.trace('startup', 'Loaded Leveling API configuration from Database')
         except:
-            self.api_config = self.get_static_config()
+            config = self.get_static_config()
             self.log.trace('startup', 'Loaded Leveling API configuration from local file')
 
-        return
+        return config
+
+    async def update_config(self) -> bool:
+        ''' Compiles the stored configuration and swaps it in if its content changed - returns whether it did '''
+
+        config = await self.load_config()
+        version = self.progression.version + 1 if self.progression else 1
+
+        try:
+            progression = ProgressionTable(config, statistic=Statistic, version=version)
+        except ConfigurationError as error:
+            if self.progression is not None:
+                active = self.progression.version
+                self.log.error('startup', f'Rejected Leveling Configuration, keeping Version {active} - {error}')
+                return False
+
+            self.log.error('startup', f'Rejected Leveling Configuration, using local file - {error}')
+
+            config = self.get_static_config()
+            progression = ProgressionTable(config, statistic=Statistic, version=version)
+
+        if self.progression is not None and progression.fingerprint == self.progression.fingerprint:
+            return False
+
+        # Single assignments with no await in between - readers see either the old tables or the new ones
+        self.api_config = config
+        self.progression = progression
+
+        # Caches derived from the old tables are retired by their version, so nothing is flushed or rebuilt eagerly
+        self.guild_profiles.version = progression.version
+        self.global_profiles.version = progression.version
+
+        if self.boosts is None:
+            self.boosts = BoostCache(
+                progression.boosts,
+                maxsize = ProfileCacheConfig.maxsize,
+                ttl = ProfileCacheConfig.ttl,
+                version = progression.version
+            )
+        else:
+            self.boosts.rebase(progression.boosts, version=progression.version)
+
+        self.log.debug('startup', f'Leveling Configuration Version {progression.version} is now Active')
 
-    async def check_existing(self, *, userId: int, guildId: Optional[int]) -> bool:
-        query = 'SELECT * FROM user_levels WHERE user_id = $1'
+        return True
+
+    async def reconfigure(self) -> bool:
+        return await self.update_config()
+
+    async def check_existing(self, *, userId: int, guildId: Optional[int] = None) -> bool:
+        name = 'fetch_global_user'
         args = (userId, )
 
         if guildId:
-            query = 'SELECT * FROM guild_levels WHERE user_id = $1 AND guild_id = $2'
-            args = (userId, guildId)
+            name = 'fetch_guild_user'
+            args = (guildId, userId)
 
-        results = await super().fetchone(query, args)
+        results = await super().fetchnamed(name, args)
         if results:
             return True
 
@@ -179,160 +396,114 @@ class API(database.Connector):
 
     @staticmethod
     def _iterate(*, value: int, bounds: list):
-        pos = -1
+        pos = bisect_right(bounds, value) - 1
 
-        for bound in bounds:
-            if value >= bound:
-                pos += 1
-            else:
-                remaining = bound - value
-                break
+        if pos + 1 < len(bounds):
+            return pos, pos+1, bounds[pos+1] - value
 
-        try:
-            _ = bounds[pos+1]
-        except IndexError:
-            next = remaining = None
-        else:
-            next = pos+1
+        return pos, None, None
 
-        return pos, next, remaining
-
-    @staticmethod
-    def _getLevelSet(*, xp: int) -> str:
-        if xp < 300000:
-            return '0'
-        elif xp < 1000000:
-            return '1'
-        else:
-            return '2'
+    def _getLevelSet(self, *, xp: int) -> str:
+        return self.progression.level_set(xp)
 
     def _getPrestige(self, *, xp: int) -> Statistic:
-        bounds = self.api_config["Prestiges"]["Bounds"]
-        current, next, remaining = self._iterate(value=xp, bounds=bounds)
-
-        current = self.api_config["Prestiges"]["Names"][current]
-
-        if not next and not remaining:
-            next = remaining = 'Max Prestige Reached!'
-        else:
-            next = self.api_config["Prestiges"]["Names"][next]
-            remaining = remaining
-
-        prestige = Statistic(
-            current = current,
-            next = next,
-            remaining = remaining
-        )
-
-        return prestige
+        return self.progression.prestige(xp)
 
     def _getLevel(self, *, xp: int, set: Optional[str]) -> Statistic:
-        if not set:
-            set = self._getLevelSet(xp=xp)
-        if set == '0':
-            xp %= 50000
-
-        bounds = self.api_config["Levels"][set]
-
-        i = 0
-        for bound in bounds:
-            if xp >= bound:
-                i += 1
-            elif xp < bound or i == 10:
-                remaining = bound - xp
-                break
+        return self.progression.level(xp, set)
 
-        current = f'Level {i}'
-        if i == 10:
-            next = 'Prestige Available Soon ...'
-        else:
-            next = f'Level {i+1}'
+    def _getLeague(self, *, xp: int) -> Statistic:
+        return self.progression.league(xp)
 
-        remaining = remaining
+    def _getBoost(self, *, xp: int) -> Statistic:
+        return self.progression.boost(xp)
 
-        level = Statistic(
-            current = current,
-            next = next,
-            remaining = remaining
-        )
+    async def convert_profiles(self, experience: List[int]) -> Dict[str, list]:
+        ''' Batch form of the converters above, for leaderboards and exports '''
 
-        return level
+        if not self.api_config:
+            await self.update_config()
 
-    def _getLeague(self, *, xp: int) -> Statistic:
-        bounds = self.api_config["Leagues"]["Bounds"]
-        current, next, remaining = self._iterate(value=xp, bounds=bounds)
+        return self.progression.convert_many(experience)
 
-        current = self.api_config["Leagues"]["Names"][current]
+    # End Region
 
-        if not next and not remaining:
-            next = remaining = 'Max League Achieved!'
-        else:
-            next = self.api_config["Leagues"]["Names"][next]
-            remaining = remaining
+    # Region: Interactive Handlers
 
-        league = Statistic(
-            current = current,
-            next = next,
-            remaining = remaining
-        )
+    async def fetch_settled(self, name: str, args: tuple) -> Optional[Record]:
+        ''' Runs a named fetch that no flush overlapped, so buffered deltas added on top are never counted twice '''
 
-        return league
+        # A flush that starts or settles mid-read bumps the epoch, and the read is repeated
+        while True:
+            epoch = await self.experience_buffer.settled()
+            results = await super().fetchnamed(name, args)
 
-    def _getBoost(self, *, xp: int) -> Statistic:
-        boost = Statistic()
+            if epoch == self.experience_buffer.epoch:
+                return results
 
-        bounds = self.api_config["Boosts"]["Bounds"]
-        current, next, remaining = self._iterate(value=xp, bounds=bounds)
+    async def fetch_boost(self, *, userId: int) -> int:
+        if not self.api_config:
+            await self.update_config()
 
-        current = self.api_config["Boosts"]["Values"][current]
+        cached = self.boosts.get(userId)
+        if cached is not None:
+            return cached
 
-        if not next and not remaining:
-            next = remaining = 'Max Boost Earned!'
-        else:
-            next = self.api_config["Boosts"]["Values"][next]
-            remaining = remaining
+        args = (userId, )
 
-        boost = Statistic(
-            current = current,
-            next = next,
-            remaining = remaining
-        )
+        results = await self.fetch_settled('fetch_experience', args)
 
-        return boost
+        # Members without a global record yet earn the base boost until the flush that creates it lands
+        stored = results["experience"] if results else 0
+        experience = stored + self.experience_buffer.pending_global(userId=userId)
 
-    # End Region
+        return self.boosts.load(userId, experience)
 
-    # Region: Interactive Handlers
+    def build_guild_profile(self, *, guildId: int, userId: int, experience: int, artificial: int) -> GuildUser:
+        user = GuildUser(
+            guildId,
+            user_id = userId,
+            experience = experience,
+            artificial = artificial,
+            prestige = self._getPrestige(xp=experience),
+            level = self._getLevel(xp=experience, set=None)
+        )
 
-    async def fetch_boost(self, *, userId: int) -> int:
-        query = 'SELECT experience FROM user_levels WHERE user_id = $1'
-        args = (userId, )
+        return user
 
-        results = await super().fetchone(query, args)
-        boost = self._getBoost(xp=results["experience"])
+    def build_global_profile(self, *, userId: int, experience: int) -> GlobalUser:
+        user = GlobalUser(
+            user_id = userId,
+            experience = experience,
+            league = self._getLeague(xp=experience),
+            boost = self._getBoost(xp=experience)
+        )
 
-        return boost.current
+        return user
 
     async def fetch_guild_user(self, *, guildId: int, userId: int) -> GuildUser:
         if not self.api_config:
             await self.update_config()
 
-        query = 'SELECT * FROM guild_levels WHERE guild_id = $1 AND user_id = $2'
+        cached = self.guild_profiles.get((guildId, userId))
+        if cached is not None:
+            return cached
+
         args = (guildId, userId)
 
-        results = await super().fetchone(query, args)
-        experience = results['experience']
+        results = await self.fetch_settled('fetch_guild_user', args)
 
-        prestige = self._getPrestige(xp=experience)
-        level = self._getLevel(xp=experience, set=None)
+        # Members without a row yet only have buffered experience until the flush that creates it lands
+        stored, stored_artificial = (results['experience'], results['artificial']) if results else (0, 0)
+        pending, pending_artificial = self.experience_buffer.pending_guild(guildId=guildId, userId=userId)
 
-        user = GuildUser(guildId,
-            user_id = userId,
-            experience = results['experience'],
-            artificial = results['artificial'],
-            prestige = prestige,
-            level = level
+        user = self.build_guild_profile(
+            guildId = guildId,
+            userId = userId,
+            experience = stored + pending,
+            artificial = stored_artificial + pending_artificial
         )
+        self.guild_profiles.put((guildId, userId), user)
 
         return user
 
@@ -340,104 +511,908 @@ class API(database.Connector):
         if not self.api_config:
             await self.update_config()
 
-        query = 'SELECT * FROM user_levels WHERE user_id = $1'
+        cached = self.global_profiles.get(userId)
+        if cached is not None:
+            return cached
+
         args = (userId, )
 
-        results = await super().fetchone(query, args)
-        experience = results['experience']
+        results = await self.fetch_settled('fetch_global_user', args)
 
-        league = self._getLeague(xp=experience)
-        boost = self._getBoost(xp=experience)
+        stored = results['experience'] if results else 0
+        experience = stored + self.experience_buffer.pending_global(userId=userId)
 
-        user = GlobalUser(
-            user_id = userId,
-            experience = experience,
-            league = league,
-            boost = boost
-        )
+        user = self.build_global_profile(userId=userId, experience=experience)
+        self.global_profiles.put(userId, user)
 
         return user
 
-    async def fetch_guild_ranks(self, *, guildId: int, userId: Optional[int], limit: Optional[int]):
+    async def fetch_guild_ranks(self, *, guildId: int, userId: Optional[int] = None,
+                                limit: Optional[int] = None) -> Union[Optional[int], List[Tuple[int, int]]]:
         '''
-            Either selects the first `limit` results ordered by experience OR
-            selects all records ordered by experience, and returns the position of the user specified
+            Either returns the first `limit` (user_id, experience) pairs ordered by experience OR
+            returns the position of the user specified - both answered from the in-memory rank index
         '''
 
-    async def fetch_global_ranks(self, *, userId: Optional[int], limit: Optional[int]):
+        index = self.guild_ranks.get(guildId)
+        if index is None:
+            index = await self.warm_guild_ranks(guildId=guildId)
+
+        if userId:
+            return index.rank(userId)
+
+        return index.top(limit or 10)
+
+    async def fetch_global_ranks(self, *, userId: Optional[int] = None,
+                                 limit: Optional[int] = None) -> Union[Optional[int], List[Tuple[int, int]]]:
         '''
-            Either selects the first `limit` results ordered by experience OR
-            selects all records ordered by experience and returns the position of the user specified
+            Either returns the first `limit` (user_id, experience) pairs ordered by experience OR
+            returns the position of the user specified - both answered from the in-memory rank index
         '''
 
+        if self.global_ranks is None:
+            await self.warm_global_ranks()
+
+        # Only the top `RankingConfig.exact_top` users are indexed - see `fetch_global_standing` for everyone else
+        if userId:
+            return self.global_ranks.rank(userId)
+
+        return self.global_ranks.top(limit or 10)
+
+    async def fetch_global_standing(self, *, userId: int) -> Optional[GlobalStanding]:
+        ''' Exact rank for indexed users, otherwise an estimate from the global XP histogram '''
+
+        if self.global_ranks is None:
+            await self.warm_global_ranks()
+
+        if self.global_sketch is None:
+            await self.warm_global_sketch()
+        elif self.sketch_drift > RankingConfig.resync_drift * max(len(self.global_sketch), 1):
+            await self.warm_global_sketch()
+
+        total = max(len(self.global_sketch), 1)
+
+        position = self.global_ranks.rank(userId)
+        if position is not None:
+            return GlobalStanding(user_id=userId, rank=position, percentile=100.0 * position / total, exact=True)
+
+        experience = self.known_global_experience(userId)
+        if experience is None:
+            results = await self.fetch_settled('fetch_experience', (userId, ))
+            if results is None:
+                return None
+
+            experience = results['experience'] + self.experience_buffer.pending_global(userId=userId)
+
+        rank = self.global_sketch.estimate_rank(experience)
+
+        # Everyone in a full index is known to be ahead
+        if len(self.global_ranks) >= RankingConfig.exact_top:
+            rank = max(rank, len(self.global_ranks) + 1)
+
+        standing = GlobalStanding(
+            user_id = userId,
+            rank = rank,
+            percentile = min(100.0 * rank / total, 100.0),
+            exact = False,
+            error = self.global_sketch.error_bound(experience)
+        )
+
+        return standing
+
     async def insert_guild_user(self, *, guildId: int, userId: int) -> bool:
-        overwrite = await self.check_existing(userId=userId, guildId=guildId)
+        args = (guildId, userId)
+
+        # The conflict clause replaces the `check_existing` round trip - no returned row means it already existed
+        created = await super().fetchnamed('insert_guild_user', args)
 
-        if overwrite:
+        if created is None:
             raise UserOverwriteError(f'Cannot Overwrite Index (guild, user) - ({guildId}, {userId})')
 
-        query = 'INSERT INTO guild_levels (guild_id, user_id, experience, artificial) VALUES ($1, $2, $3, $4)'
-        args = (guildId, userId, 0, 0)
-        status = await super().insertone(query, args)
+        index = self.guild_ranks.peek(guildId)
+        if index is not None:
+            index.update(userId, 0)
 
-        return status
+        self.mark_leaderboards(guildId=guildId, globally=False)
+
+        self.guild_profiles.invalidate((guildId, userId))
+
+        return True
 
     async def insert_global_user(self, *, userId: int) -> bool:
-        overwrite = await self.check_existing(userId=userId)
+        args = (userId, )
 
-        if overwrite:
+        created = await super().fetchnamed('insert_global_user', args)
+
+        if created is None:
             raise UserOverwriteError(f'Cannot Overwrite Index (user) - ({userId})')
 
-        query = 'INSERT INTO user_levels (user_id, experience) VALUES ($1, $2)'
-        args = (userId, 0)
-        status = await super().insertone(query, args)
+        self.place_global(userId, 0)
+
+        if self.global_sketch is not None:
+            self.global_sketch.add(0)
+
+        self.mark_leaderboards(guildId=None, globally=True)
 
-        return status
+        self.global_profiles.invalidate(userId)
+
+        return True
 
     async def force_insert(self, data: tuple, *, guild: bool=False) -> bool:
+        # Pending deltas belong to the record being replaced, so they must land before the overwrite
+        await self.flush_experience()
+
         if guild:
-            overwrite = await self.check_existing(userId=data[1], guildId=data[0])
+            results = await super().fetchnamed('overwrite_guild_user', data)
             record = f'({data[0]}, {data[1]})'
         else:
-            ovewrite = await self.check_existing(userId=data[0])
+            results = await super().fetchnamed('overwrite_global_user', data)
             record = f'({data[0]})'
 
-        if overwrite:
-            self.log.info('database', f'Overwriting Record: {record} ...')
+        if results is None:
+            return False
 
-            if guild:
-                statement = 'DELETE FROM guild_levels WHERE guild_id = $1 AND user_id = $2'
-                args = (data[0], data[1])
-            else:
-                statement = 'DELETE FROM user_levels WHERE user_id = $1'
-                args = (data[0], )
+        if results['overwritten']:
+            self.log.info('database', f'Overwrote Record: {record}')
+
+        index = self.guild_ranks.peek(data[0]) if guild else None
+
+        if index is not None:
+            index.update(data[1], data[2])
+        elif not guild:
+            self.overwrite_global(data[0], data[1], overwritten=results['overwritten'])
 
-            status = await super().executeone(statement, args)
+        self.mark_leaderboards(guildId=data[0] if guild else None, globally=not guild)
 
         if guild:
-            query = 'INSERT INTO guild_levels (guild_id, user_id, experience, artificial) VALUES ($1, $2, $3, $4)'
+            self.guild_profiles.invalidate((data[0], data[1]))
         else:
-            query = 'INSERT INTO user_levels (user_id, experience) VALUES ($1, $2)'
+            self.global_profiles.invalidate(data[0])
 
-        status = await super().insertone(query, data)
+            if self.boosts is not None:
+                self.boosts.invalidate(data[0])
 
-        return status
+        return True
 
-    async def add_experience(self, userId: int, *, guildId: Optional[int], amount: int, artificial: bool=False) -> bool:
-        if guildId:
-            query = 'UPDATE guild_levels SET experience + $1 WHERE guild_id = $2 AND user_id = $3'
-            args = (amount, guildId, userId)
+    async def add_experience(self, userId: int, *, guildId: Optional[int], amount: int, artificial: bool=False) -> None:
+        if not guildId and not artificial:
+            raise GlobalPermissionsError(f'Cannot Add Natural Experience to User {userId} without a Guild')
+
+        self.experience_buffer.add(userId, guildId=guildId, amount=amount, artificial=artificial)
+        self.update_ranks(userId, guildId=guildId, amount=amount, artificial=artificial)
+        self.update_profiles(userId, guildId=guildId, amount=amount, artificial=artificial)
+
+        if not artificial and self.boosts is not None:
+            self.boosts.add(userId, amount)
+
+        if self.experience_buffer.due() and not self.flush_lock.locked():
+            asyncio.ensure_future(self.flush_experience())
+
+        if self.flusher is None or self.flusher.done():
+            self.flusher = asyncio.ensure_future(self.flush_periodically())
+
+    # End Region
+
+    # Region: Message Ingestion
+
+    def cached_boost(self, *, userId: int) -> int:
+        ''' Boost without touching the database - the base boost while an unknown user is looked up '''
+
+        boost = self.boosts.get(userId)
+        if boost is not None:
+            return boost
+
+        cached = self.global_profiles.peek(userId)
+        if cached is not None:
+            return self.boosts.load(userId, cached.experience)
+
+        if self.global_ranks is not None and userId in self.global_ranks:
+            return self.boosts.load(userId, self.global_ranks.scores[userId])
+
+        if userId not in self.boost_lookups:
+            asyncio.ensure_future(self.warm_boost(userId=userId))
+
+        return self.progression.boosts.labels[0]
+
+    async def warm_boost(self, *, userId: int) -> None:
+        self.boost_lookups.add(userId)
+
+        try:
+            await self.fetch_boost(userId=userId)
+        except Exception as error:
+            self.log.warn('database', f'Failed to Load Boost for {userId} - {error}')
+        finally:
+            self.boost_lookups.discard(userId)
+
+    async def ingest_message(self, *, guildId: int, userId: int) -> int:
+        ''' Grants message XP (the member's boost) once per cooldown window and returns the amount '''
+
+        # All in memory - the grant lands in the write-behind buffer - so bursts never wait on the database
+        if not self.cooldowns.acquire(guildId=guildId, userId=userId):
+            return 0
+
+        if not self.api_config:
+            await self.update_config()
+
+        amount = self.cached_boost(userId=userId)
+        await self.add_experience(userId, guildId=guildId, amount=amount)
+
+        return amount
+
+    def ingestion_stats(self) -> dict:
+        stats = {
+            "cooldowns": self.cooldowns.stats(),
+            "buffer": self.experience_buffer.stats()
+        }
+
+        return stats
+
+    # End Region
+
+    # Region: Rank Indexes
+
+    async def warm_guild_ranks(self, *, guildId: int) -> RankIndex:
+        ''' Indexes a guild without holding up flushes while it streams '''
 
-            if artificial:
-                query = 'UPDATE guild_levels SET experience + $1, artificial + $1 WHERE guild_id = $2 AND user_id = $3'
+        query = 'SELECT user_id, experience FROM guild_levels WHERE guild_id = $1'
 
-            status = await super().executeone(query, args)
+        async with super().connect() as connection:
+            async with connection.transaction(isolation='repeatable_read', readonly=True):
+                # Only pinning the snapshot waits for the flush lock - with no flush in flight, the deltas buffered
+                # at that moment are exactly the ones it lacks, and `update_ranks` collects the ones after it
+                async with self.flush_lock:
+                    # A repeatable read snapshot is taken by the first statement, not by BEGIN
+                    await connection.execute('SELECT 1')
+
+                    collected = self.experience_buffer.pending_members(guildId=guildId)
+                    self.warming.setdefault(guildId, []).append(collected)
+
+                try:
+                    cursor = connection.cursor(query, guildId, prefetch=CursorConfig.prefetch)
+                    stored = {record['user_id']: record['experience'] async for record in cursor}
+                finally:
+                    self.warming[guildId].remove(collected)
+                    if not self.warming[guildId]:
+                        del self.warming[guildId]
+
+                # No awaits from here until the index is registered, so no delta is missed in between
+                index = RankIndex((user, experience + collected.pop(user, 0)) for user, experience in stored.items())
+
+                # Rows created while streaming are placed here, the rest by the flush that creates them
+                for user, experience in collected.items():
+                    if not self.experience_buffer.pending_guild(guildId=guildId, userId=user)[0]:
+                        index.update(user, experience)
+
+                self.guild_ranks.put(guildId, index)
+
+        self.log.trace('database', f'Warmed Rank Index for Guild {guildId} ({len(index)} Members)')
+
+        return index
+
+    async def warm_global_ranks(self) -> RankIndex:
+        ''' Indexes the top `RankingConfig.exact_top` users - ranks below that come from the histogram '''
+
+        # Deltas still in the buffer could reorder users around the cut-off, so land them first
+        await self.flush_experience()
+
+        async with self.flush_lock:
+            records = await super().fetchallnamed('fetch_global_leaderboard', (RankingConfig.exact_top, ))
+
+            pending = self.experience_buffer.pending_global
+            index = RankIndex(
+                (record['user_id'], record['experience'] + pending(userId=record['user_id'])) for record in records
+            )
+            self.global_ranks = index
+
+        self.log.trace('database', f'Warmed Global Rank Index (Top {len(index)} Users)')
+
+        return index
+
+    async def warm_global_sketch(self) -> ExperienceHistogram:
+        sketch = ExperienceHistogram(base=RankingConfig.histogram_base)
+
+        await self.flush_experience()
+
+        # Bucketed by the database with the same bounds, so only one row per occupied bucket comes back
+        async with self.flush_lock:
+            records = await super().fetchallnamed('fetch_global_histogram', (list(sketch.bounds), ))
+
+            sketch.load_counts((record['bucket'], record['members']) for record in records)
+            self.global_sketch = sketch
+            self.sketch_drift = 0
+
+        self.log.trace('database', f'Warmed Global XP Histogram ({len(sketch)} Users, {len(records)} Buckets)')
+
+        return sketch
+
+    def known_global_experience(self, userId: int) -> Optional[int]:
+        ''' Current global total (pending deltas included) if any in-memory structure holds it '''
+
+        if self.global_ranks is not None and userId in self.global_ranks:
+            return self.global_ranks.scores[userId]
+
+        if self.boosts is not None:
+            experience = self.boosts.experience(userId)
+            if experience is not None:
+                return experience
+
+        cached = self.global_profiles.peek(userId)
+        if cached is not None:
+            return cached.experience
+
+        return None
+
+    def place_global(self, userId: int, experience: int) -> None:
+        ''' Keeps the capped global index holding the highest totals it has seen '''
+
+        index = self.global_ranks
+        if index is None:
+            return
+
+        if userId in index or len(index) < RankingConfig.exact_top or experience > index.lowest():
+            index.update(userId, experience)
+            index.trim(RankingConfig.exact_top)
+
+    def overwrite_global(self, userId: int, experience: int, *, overwritten: bool) -> None:
+        previous = self.known_global_experience(userId)
+
+        self.place_global(userId, experience)
+
+        if self.global_sketch is None:
+            return
+
+        if not overwritten:
+            self.global_sketch.add(experience)
+        elif previous is not None:
+            self.global_sketch.move(previous, experience)
+        else:
+            self.sketch_drift += 1
+
+    def update_ranks(self, userId: int, *, guildId: Optional[int], amount: int, artificial: bool) -> None:
+        ''' Applies an XP delta to the warmed rank indexes and the global XP histogram '''
+
+        guild_index = self.guild_ranks.peek(guildId)
+        if guild_index is None:
+            for collected in self.warming.get(guildId, ()):
+                collected[userId] = collected.get(userId, 0) + amount
+
+        # Members without a stored row are placed by the flush that creates it - see `place_flushed`
+        elif userId in guild_index:
+            guild_index.increment(userId, amount)
 
         if not artificial:
-            query = 'UPDATE user_levels SET experience + $1 WHERE user_id = $2'
-            args = (amount, userId)
+            previous = self.known_global_experience(userId)
 
-            status = await super().executeone(query, args)
+            if previous is None:
+                self.sketch_drift += 1
+            else:
+                self.place_global(userId, previous + amount)
 
-        if not guildId and not artificial:
-            raise GlobalPermissionsError()
+                if self.global_sketch is not None:
+                    self.global_sketch.move(previous, previous + amount)
+
+        self.mark_leaderboards(guildId=guildId, globally=not artificial)
+
+    def place_flushed(self, merged: List[Record]) -> None:
+        ''' Adds members a flush just gave a guild row to their guild's warmed index '''
+
+        for record in merged:
+            guild, user = record['guild_id'], record['user_id']
+
+            index = self.guild_ranks.peek(guild)
+            if index is None or user in index:
+                continue
+
+            # Deltas buffered after the drain skipped the index, so they are added on top of the stored total
+            pending, _ = self.experience_buffer.pending_guild(guildId=guild, userId=user)
+            index.update(user, record['experience'] + pending)
+
+    # End Region
+
+    # Region: Leaderboard Snapshots
+
+    def mark_leaderboards(self, *, guildId: Optional[int], globally: bool) -> None:
+        if guildId:
+            self.stale_leaderboards.add(guildId)
+        if globally:
+            self.stale_leaderboards.add(GLOBAL_SCOPE)
+
+    async def compute_leaderboard(self, scope: int) -> LeaderboardSnapshot:
+        ''' Builds a fresh snapshot - from a warmed rank index when there is one, otherwise from the tables '''
+
+        size = LeaderboardConfig.size
+
+        if scope == GLOBAL_SCOPE and self.global_ranks is not None:
+            return LeaderboardSnapshot(scope, self.global_ranks.top(size))
+        index = self.guild_ranks.peek(scope)
+        if index is not None:
+            return LeaderboardSnapshot(scope, index.top(size))
+
+        # Stored totals only match the index once the buffered deltas have landed
+        await self.flush_experience()
+
+        if scope == GLOBAL_SCOPE:
+            records = await super().fetchallnamed('fetch_global_leaderboard', (size, ))
+        else:
+            records = await super().fetchallnamed('fetch_guild_leaderboard', (scope, size))
+
+        return LeaderboardSnapshot(scope, [(record['user_id'], record['experience']) for record in records])
+
+    async def refresh_leaderboards(self) -> int:
+        ''' Re-snapshots every scope whose experience changed since the last refresh '''
+
+        stale, self.stale_leaderboards = self.stale_leaderboards, set()
+        if not stale:
+            return 0
+
+        started = time.perf_counter()
+        snapshots = []
+
+        try:
+            for scope in stale:
+                snapshots.append(await self.compute_leaderboard(scope))
+
+            records = [snapshot.to_record() for snapshot in snapshots]
+            await super().executemanynamed('store_snapshot', records)
+
+        except Exception as error:
+            self.stale_leaderboards |= stale
+            self.log.error('database', f'Failed to Refresh {len(stale)} Leaderboard Snapshots - {error}')
+
+            return 0
+
+        for snapshot in snapshots:
+            self.leaderboards[snapshot.scope] = snapshot
+
+        elapsed = (time.perf_counter() - started) * 1000
+        self.log.trace('database', f'Refreshed {len(snapshots)} Leaderboard Snapshots in {elapsed:.1f}ms')
+
+        return len(snapshots)
+
+    async def fetch_leaderboard(self, *, guildId: Optional[int] = None) -> LeaderboardSnapshot:
+        ''' Latest snapshot for a guild (or the global ranking when no guild is given) - never recomputed per call '''
+
+        scope = guildId or GLOBAL_SCOPE
+
+        snapshot = self.leaderboards.get(scope)
+        if snapshot is not None:
+            return snapshot
+
+        record = await super().fetchnamed('fetch_snapshot', (scope, ))
+
+        if record is not None:
+            snapshot = LeaderboardSnapshot.from_record(record)
+        else:
+            snapshot = await self.compute_leaderboard(scope)
+            await super().executenamed('store_snapshot', snapshot.to_record())
+
+        self.leaderboards[scope] = snapshot
+
+        return snapshot
+
+    # End Region
+
+    # Region: XP History
+
+    @staticmethod
+    def history_start(days: int) -> datetime:
+        ''' Midnight (UTC) opening a window of `days` calendar days that ends today '''
+
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        return today - timedelta(days=max(days, 1) - 1)
+
+    async def fetch_top_gainers(self, *, guildId: int, days: int = 7, limit: int = 10) -> List[Tuple[int, int]]:
+        ''' `(user_id, experience gained)` pairs for the last `days` calendar days, from the hourly/daily rollups '''
+
+        # Rollups only cover flushed experience - deltas still in the buffer show up after the next flush
+        args = (guildId, self.history_start(days), limit)
+        records = await super().fetchallnamed('fetch_top_gainers', args)
+
+        return [(record['user_id'], record['gained']) for record in records]
+
+    async def fetch_user_gains(self, *, guildId: int, userId: int, days: int = 7) -> int:
+        args = (guildId, userId, self.history_start(days))
+        results = await self.fetch_settled('fetch_user_gains', args)
+
+        return results['gained'] + self.experience_buffer.pending_guild(guildId=guildId, userId=userId)[0]
+
+    async def compact_history(self) -> Tuple[int, int]:
+        ''' Rolls hourly buckets older than their retention into daily ones and expires old daily buckets '''
+
+        now = datetime.now(timezone.utc)
+        hourly_cutoff = self.history_start(HistoryConfig.hourly_retention)
+        daily_cutoff = now - timedelta(days=HistoryConfig.daily_retention)
+
+        started = time.perf_counter()
+
+        async with super().connect() as connection:
+            async with connection.transaction():
+                compacted = await connection.execute(self.registry.lookup(connection, 'compact_history'), hourly_cutoff)
+                expired = await connection.execute(self.registry.lookup(connection, 'expire_history'), daily_cutoff)
+
+        compacted, expired = int(compacted.split()[-1]), int(expired.split()[-1])
+        self.log.trace('database', (
+            f'Compacted XP History into {compacted} Daily Buckets and Expired {expired} '
+            f'in {(time.perf_counter() - started) * 1000:.1f}ms'
+        ))
+
+        return compacted, expired
+
+    # End Region
+
+    # Region: Maintenance Jobs
+
+    async def run_maintenance(self, job: MaintenanceJob, *, chunk_size: Optional[int] = None,
+                              progress: Optional[Callable[[JobProgress], Any]] = None) -> JobProgress:
+        ''' Runs a set-based job over `guild_levels` one keyset chunk (and one transaction) at a time '''
+
+        chunk_size = chunk_size or MaintenanceConfig.chunk_size
+
+        # Sleeping in proportion to each chunk's duration keeps the job within its duty cycle, so a busy
+        # database (slow chunks) backs it off automatically
+        idle = 1 / MaintenanceConfig.duty_cycle - 1
+
+        state = self.maintenance.get(job.key)
+        if state is None or state.finished:
+            state = self.maintenance[job.key] = JobProgress(job.name, guild_id=job.guild_id)
+        else:
+            self.log.info('database', f'Resuming {job.name} after {state.checkpoint}')
+
+        # Buffered deltas were earned before the job started, so they belong under it
+        await self.flush_experience()
+
+        statement = job.statement()
+        last = state.checkpoint or ((job.guild_id, -1) if job.guild_id else (-1, -1))
+
+        while True:
+            started = time.perf_counter()
+
+            args = (*last, chunk_size, job.guild_id, *job.parameters())
+            results = await super().fetchone(statement, args)
+
+            if results is None:
+                break
+
+            last = state.checkpoint = (results['guild_id'], results['user_id'])
+            state.chunks += 1
+            state.processed += results['scanned']
+            state.updated += results['updated']
+
+            if progress:
+                outcome = progress(state)
+                if inspect.isawaitable(outcome):
+                    await outcome
+
+            if results['scanned'] < chunk_size:
+                break
+
+            await asyncio.sleep((time.perf_counter() - started) * idle)
+
+        state.finished = True
+        await self.invalidate_guilds(guildId=job.guild_id)
+
+        self.log.info('database', f'Finished Maintenance Job - {state}')
+
+        return state
+
+    async def reset_season(self, *, guildId: Optional[int] = None, keep_prestige: bool = True,
+                           progress: Optional[Callable[[JobProgress], Any]] = None) -> JobProgress:
+        if not self.api_config:
+            await self.update_config()
+
+        floors = self.progression.prestiges.bounds if keep_prestige else (0, )
+        job = SeasonalReset(guildId=guildId, floors=floors)
+
+        return await self.run_maintenance(job, progress=progress)
+
+    async def decay_inactive(self, *, days: int, rate: float, guildId: Optional[int] = None,
+                             progress: Optional[Callable[[JobProgress], Any]] = None) -> JobProgress:
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        job = InactivityDecay(guildId=guildId, since=since, rate=rate)
+
+        return await self.run_maintenance(job, progress=progress)
+
+    async def invalidate_guilds(self, *, guildId: Optional[int] = None) -> None:
+        ''' Drops everything held in memory (or snapshotted) for one guild - every guild if none is given '''
+
+        if guildId:
+            self.guild_ranks.invalidate(guildId)
+            self.leaderboards.pop(guildId, None)
+
+            for key in [key for key in self.guild_profiles.entries if key[0] == guildId]:
+                self.guild_profiles.invalidate(key)
+        else:
+            self.guild_ranks.clear()
+            self.guild_profiles.clear()
+
+            for scope in [scope for scope in self.leaderboards if scope != GLOBAL_SCOPE]:
+                del self.leaderboards[scope]
+
+        await super().executenamed('drop_guild_snapshots', (guildId, ))
+
+    # End Region
+
+    # Region: Backups
+
+    def level_backup(self, directory: Optional[str] = None) -> LevelBackup:
+        backup = LevelBackup(
+            self,
+            directory = directory,
+            chunk_rows = BackupConfig.chunk_rows,
+            workers = BackupConfig.workers,
+            level = BackupConfig.compression
+        )
+
+        return backup
+
+    async def backup_levels(self, *, directory: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+        ''' Streams `guild_levels` and `user_levels` into a new compressed, checksummed backup '''
+
+        await self.flush_experience()
+
+        started = time.perf_counter()
+        name, manifest = await self.level_backup(directory).create()
+
+        rows = sum(chunk["rows"] for table in manifest["tables"].values() for chunk in table["chunks"])
+        elapsed = time.perf_counter() - started
+        self.log.info('database', f'Created Leveling Backup {name} ({rows} Rows) in {elapsed:.1f}s')
+
+        return name, manifest
+
+    async def restore_levels(self, name: Optional[str] = None, *, directory: Optional[str] = None) -> Dict[str, int]:
+        ''' Replaces both leveling tables with a backup - the latest one unless `name` is given '''
+
+        backup = self.level_backup(directory)
+        available = backup.backups()
+
+        if name is None:
+            if not available:
+                raise NoBackupFound(f'No Leveling Backups Found in {backup.directory}')
+            name = available[-1]
+        elif name not in available:
+            raise NoBackupFound(f'Backup "{name}" Does Not Exist (or has no Manifest)')
+
+        manifest = backup.load_manifest(name)
+
+        # Every chunk is checked before anything is truncated
+        corrupted = await backup.verify(name, manifest)
+        if corrupted:
+            raise NoBackupFound(f'Backup "{name}" is Incomplete - Missing or Corrupted: {", ".join(corrupted)}')
+
+        started = time.perf_counter()
+
+        async with self.flush_lock:
+            restored = await backup.restore(name, manifest)
+
+        await self.invalidate_guilds()
+
+        self.global_ranks = None
+        self.global_sketch = None
+        self.global_profiles.clear()
+        if self.boosts is not None:
+            self.boosts.clear()
+
+        self.mark_leaderboards(guildId=None, globally=True)
+        await self.refresh_leaderboards()
+
+        self.log.info('database', f'Restored Leveling Backup {name} {restored} in {time.perf_counter() - started:.1f}s')
+
+        return restored
+
+    # End Region
+
+    # Region: Bulk Onboarding
+
+    async def enroll_guild(self, *, guildId: int, members: List[Member], chunk_size: Optional[int] = None,
+                           progress: Optional[Callable[[OnboardingProgress], Any]] = None) -> OnboardingProgress:
+        ''' Enrolls every member into `guild_levels` and `user_levels`, one COPY + INSERT ... ON CONFLICT per chunk '''
+
+        chunk_size = chunk_size or OnboardingConfig.chunk_size
+
+        state = self.onboarding.get(guildId)
+        if state is None or state.finished:
+            state = self.onboarding[guildId] = OnboardingProgress(guildId, total=len(members))
+        else:
+            self.log.info('database', f'Resuming Enrollment for Guild {guildId} after Member {state.checkpoint}')
+
+        # Ascending ids let an interrupted run resume after its last committed chunk - existing rows are skipped
+        ordered = sorted(members, key=attrgetter('id'))
+        if state.checkpoint is not None:
+            ordered = [member for member in ordered if member.id > state.checkpoint]
+
+        remaining = iter(ordered)
+
+        while True:
+            chunk = list(islice(remaining, chunk_size))
+            if not chunk:
+                break
+
+            guild_ids, global_ids = await self.enroll_chunk(guildId=guildId, members=chunk)
+
+            index = self.guild_ranks.peek(guildId)
+            for user in guild_ids:
+                if index is not None and user not in index:
+                    index.update(user, 0)
+
+            for user in global_ids:
+                if self.global_ranks is not None and user not in self.global_ranks:
+                    self.place_global(user, 0)
+
+            if self.global_sketch is not None:
+                self.global_sketch.add(0, len(global_ids))
+
+            self.mark_leaderboards(guildId=guildId if guild_ids else None, globally=bool(global_ids))
+
+            state.chunks += 1
+            state.processed += len(chunk)
+            state.guild_inserted += len(guild_ids)
+            state.global_inserted += len(global_ids)
+            state.checkpoint = chunk[-1].id
+
+            if progress:
+                outcome = progress(state)
+                if inspect.isawaitable(outcome):
+                    await outcome
+
+        state.finished = True
+        self.log.info('database', f'Finished Enrollment - {state}')
+
+        return state
+
+    async def enroll_chunk(self, *, guildId: int, members: List[Member]) -> Tuple[List[int], List[int]]:
+        async with super().connect() as connection:
+            async with connection.transaction():
+                await connection.execute(
+                    'CREATE TEMPORARY TABLE guild_enrollment_staging '
+                    '(guild_id bigint, user_id bigint, experience bigint, artificial bigint) ON COMMIT DROP'
+                )
+                await connection.copy_records_to_table(
+                    'guild_enrollment_staging',
+                    records = self._batchRecords(guildId=guildId, members=members, guild=True)
+                )
+                guild_rows = await connection.fetch(
+                    'INSERT INTO guild_levels (guild_id, user_id, experience, artificial) '
+                    'SELECT guild_id, user_id, experience, artificial FROM guild_enrollment_staging '
+                    'ON CONFLICT DO NOTHING RETURNING user_id'
+                )
+
+                await connection.execute(
+                    'CREATE TEMPORARY TABLE user_enrollment_staging (user_id bigint, experience bigint) ON COMMIT DROP'
+                )
+                await connection.copy_records_to_table(
+                    'user_enrollment_staging',
+                    records = self._batchRecords(guildId=None, members=members, guild=False)
+                )
+                global_rows = await connection.fetch(
+                    'INSERT INTO user_levels (user_id, experience) '
+                    'SELECT user_id, experience FROM user_enrollment_staging '
+                    'ON CONFLICT DO NOTHING RETURNING user_id'
+                )
+
+        return [row['user_id'] for row in guild_rows], [row['user_id'] for row in global_rows]
+
+    # End Region
+
+    # Region: Profile Cache
+
+    def update_profiles(self, userId: int, *, guildId: Optional[int], amount: int, artificial: bool) -> None:
+        ''' Rebuilds cached profiles with the new experience instead of dropping them '''
+
+        cached = self.guild_profiles.peek((guildId, userId)) if guildId else None
+        if cached is not None:
+            self.guild_profiles.update((guildId, userId), self.build_guild_profile(
+                guildId = guildId,
+                userId = userId,
+                experience = cached.experience + amount,
+                artificial = cached.artificial + (amount if artificial else 0)
+            ))
+
+        cached = self.global_profiles.peek(userId) if not artificial else None
+        if cached is not None:
+            self.global_profiles.update(userId, self.build_global_profile(
+                userId = userId,
+                experience = cached.experience + amount
+            ))
+
+    def cache_stats(self) -> dict:
+        stats = {
+            "guild_profiles": self.guild_profiles.stats(),
+            "global_profiles": self.global_profiles.stats(),
+            "boosts": self.boosts.stats() if self.boosts is not None else None,
+            "guild_ranks": self.guild_ranks.stats()
+        }
+
+        return stats
+
+    # End Region
+
+    # Region: Write-Behind Buffer
+
+    async def flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.experience_buffer.flush_interval)
+
+            if self.experience_buffer.due():
+                await self.flush_experience()
+
+    async def flush_experience(self) -> int:
+        ''' Commits every pending XP delta with one COPY per table and a set-based merge '''
+
+        async with self.flush_lock:
+            if not len(self.experience_buffer):
+                return 0
+
+            guild_records, user_records = self.experience_buffer.drain()
+            started = time.perf_counter()
+
+            try:
+                async with super().connect() as connection:
+                    async with connection.transaction():
+                        await connection.execute(
+                            'CREATE TEMPORARY TABLE guild_experience_staging '
+                            '(guild_id bigint, user_id bigint, experience bigint, artificial bigint) ON COMMIT DROP; '
+                            'CREATE TEMPORARY TABLE user_experience_staging '
+                            '(user_id bigint, experience bigint) ON COMMIT DROP'
+                        )
+
+                        if guild_records:
+                            await connection.copy_records_to_table('guild_experience_staging', records=guild_records)
+                        if user_records:
+                            await connection.copy_records_to_table('user_experience_staging', records=user_records)
+
+                        # One merge statement for both tables (and the hourly history) instead of a round trip per
+                        # table. Upserts, so members who joined after their guild was enrolled get a row on their
+                        # first flush
+                        merged = await connection.fetch(
+                            'WITH guild AS ('
+                            'INSERT INTO guild_levels AS levels (guild_id, user_id, experience, artificial) '
+                            'SELECT guild_id, user_id, experience, artificial FROM guild_experience_staging '
+                            'ON CONFLICT (guild_id, user_id) DO UPDATE '
+                            'SET experience = levels.experience + EXCLUDED.experience, '
+                            'artificial = levels.artificial + EXCLUDED.artificial '
+                            'RETURNING guild_id, user_id, experience'
+                            '), history AS ('
+                            'INSERT INTO xp_history_hourly (guild_id, user_id, bucket, experience) '
+                            'SELECT guild_id, user_id, date_trunc(\'hour\', now()), experience '
+                            'FROM guild_experience_staging '
+                            'ON CONFLICT (guild_id, bucket, user_id) DO UPDATE '
+                            'SET experience = xp_history_hourly.experience + EXCLUDED.experience'
+                            '), global AS ('
+                            'INSERT INTO user_levels AS levels (user_id, experience) '
+                            'SELECT user_id, experience FROM user_experience_staging '
+                            'ON CONFLICT (user_id) DO UPDATE SET experience = levels.experience + EXCLUDED.experience'
+                            ') SELECT guild_id, user_id, experience FROM guild'
+                        )
+
+                    # Committed - readers stop adding these deltas before the connection is even released
+                    self.experience_buffer.commit(latency=time.perf_counter() - started)
+                    self.place_flushed(merged)
+
+            except asyncio.CancelledError:
+                self.experience_buffer.rollback()
+                raise
+
+            except Exception as error:
+                self.experience_buffer.rollback()
+
+                deltas = len(guild_records) + len(user_records)
+                self.log.error('database', f'Failed to Flush {deltas} XP Deltas - {error}')
+
+                return 0
+
+            self.log.trace('database', (
+                f'Flushed {self.experience_buffer.last_batch} XP Deltas '
+                f'in {self.experience_buffer.last_latency * 1000:.1f}ms'
+            ))
+
+            return self.experience_buffer.last_batch
+
+    async def shutdown(self) -> None:
+        if self.flusher:
+            self.flusher.cancel()
+            self.flusher = None
+
+        await self.flush_experience()
+
+    # End Region
@@ -0,0 +1,113 @@
+from datetime import datetime
+from typing import Tuple, Optional, Sequence
+
+from .onboarding import ChunkedProgress
+
+
+class JobProgress(ChunkedProgress):
+    ''' Resumable State of one Maintenance Job Run - `checkpoint` is the last (guild_id, user_id) committed '''
+
+    __slots__ = ('job', 'updated')
+
+    def __init__(self, job: str, *, guild_id: Optional[int]):
+        super().__init__(guild_id)
+
+        self.job = job
+        self.updated = 0
+
+    def __str__(self):
+        message = (
+            f'Job: {self.job} - {self.scope} - Chunks: {self.chunks} - '
+            f'Scanned: {self.processed} - Updated: {self.updated} - Elapsed: {self.elapsed:.1f}s'
+        )
+
+        return message
+
+
+class MaintenanceJob():
+    ''' One Set-Based Rewrite of `guild_levels`, Applied in Keyset-Ordered Chunks '''
+
+    name = 'maintenance'
+
+    # Supplied by subclasses - any extra `parameters()` start at $5, after the chunk's
+    # ($1, $2) last key, $3 chunk size and $4 guild (NULL for every guild)
+    assignments: str
+    condition = 'TRUE'
+
+    def __init__(self, *, guildId: Optional[int] = None):
+        self.guild_id = guildId
+
+    @property
+    def key(self) -> Tuple[str, Optional[int]]:
+        return (self.name, self.guild_id)
+
+    def parameters(self) -> tuple:
+        return ()
+
+    def statement(self) -> str:
+        scope = 'AND guild_id = $4' if self.guild_id else 'AND $4::bigint IS NULL'
+
+        # Each chunk is one short statement however large the table is. The update is bounded by the chunk's key
+        # range rather than joined to it, so it stays an index range scan
+        statement = (
+            'WITH chunk AS ('
+            'SELECT guild_id, user_id FROM guild_levels '
+            f'WHERE (guild_id, user_id) > ($1, $2) {scope} '
+            'ORDER BY guild_id, user_id LIMIT $3'
+            '), last AS ('
+            'SELECT guild_id, user_id FROM chunk ORDER BY guild_id DESC, user_id DESC LIMIT 1'
+            '), updated AS ('
+            f'UPDATE guild_levels AS levels SET {self.assignments} '
+            'WHERE (levels.guild_id, levels.user_id) > ($1, $2) '
+            'AND (levels.guild_id, levels.user_id) <= (SELECT guild_id, user_id FROM last) '
+            f'{scope} AND {self.condition} RETURNING 1'
+            ') SELECT (SELECT count(*) FROM chunk) AS scanned, (SELECT count(*) FROM updated) AS updated, '
+            'last.guild_id, last.user_id FROM last'
+        )
+
+        return statement
+
+
+class SeasonalReset(MaintenanceJob):
+    ''' Drops every member back to the highest of `floors` they have reached - 0 unless given '''
+
+    name = 'seasonal-reset'
+
+    assignments = (
+        'experience = coalesce((SELECT max(floor) FROM unnest($5::bigint[]) AS floor '
+        'WHERE floor <= levels.experience), 0), artificial = 0'
+    )
+    condition = 'NOT (levels.experience = ANY($5::bigint[]) AND levels.artificial = 0)'
+
+    def __init__(self, *, guildId: Optional[int] = None, floors: Sequence[int] = (0, )):
+        super().__init__(guildId=guildId)
+        self.floors = sorted(set(floors) | {0})
+
+    def parameters(self) -> tuple:
+        return (self.floors, )
+
+
+class InactivityDecay(MaintenanceJob):
+    ''' Removes `rate` of the experience of members with no recorded gains since `since` '''
+
+    name = 'inactivity-decay'
+
+    assignments = (
+        'experience = levels.experience - (levels.experience * $6::double precision)::bigint, '
+        'artificial = least(levels.artificial, levels.experience - (levels.experience * $6::double precision)::bigint)'
+    )
+    condition = (
+        'levels.experience > 0 '
+        'AND NOT EXISTS (SELECT 1 FROM xp_history_hourly AS history WHERE history.guild_id = levels.guild_id '
+        'AND history.user_id = levels.user_id AND history.bucket >= $5) '
+        'AND NOT EXISTS (SELECT 1 FROM xp_history_daily AS history WHERE history.guild_id = levels.guild_id '
+        'AND history.user_id = levels.user_id AND history.bucket >= $5)'
+    )
+
+    def __init__(self, *, guildId: Optional[int] = None, since: datetime, rate: float):
+        super().__init__(guildId=guildId)
+        self.since = since
+        self.rate = rate
+
+    def parameters(self) -> tuple:
+        return (self.since, self.rate)
@@ -0,0 +1,480 @@
+''' Versioned Schema Migrations & Query Plan Checks
+
+    Upgrade the configured database:   python -m applications.api.migrations
+    List applied / pending versions:   python -m applications.api.migrations status
+    Check the hot query plans:         python -m applications.api.migrations check [--rows N]
+
+    `check` seeds synthetic rows, runs every registered hot query under `EXPLAIN (ANALYZE)` with
+    both a custom and a generic plan, then rolls everything back - point it at a local database.
+
+    Databases created before migrations existed keep their tables, but only the table owner may
+    alter them - a superuser hands them over once with `ALTER TABLE <name> OWNER TO "schema-owner"`
+    (the configured `migrations.role`). `upgrade` lists the statements if any are still needed.
+'''
+
+import re
+import sys
+import json
+import asyncio
+import asyncpg
+import hashlib
+import argparse
+
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from . import database, leveling, infractions
+from .partitions import month_start, latest
+from ..constants import MigrationConfig
+
+
+class MigrationError(Exception):
+    def __init__(self, reason: Optional[str]):
+        self.reason = reason
+
+    def __str__(self) -> str:
+        return getattr(self, 'reason', 'Unable to Apply Schema Migrations')
+
+
+class SequentialScan(Exception):
+    def __init__(self, reason: Optional[str]):
+        self.reason = reason
+
+    def __str__(self) -> str:
+        return getattr(self, 'reason', 'A Hot Query Planned a Sequential Scan')
+
+
+class Migration():
+    ''' One Numbered Schema Change - Applied Once, in its own Transaction, and never Edited Afterwards '''
+
+    __slots__ = ('version', 'name', 'statements')
+
+    def __init__(self, version: int, name: str, *statements: str):
+        self.version = version
+        self.name = name
+        self.statements = statements
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256('\n'.join(self.statements).encode()).hexdigest()
+
+    @property
+    def tables(self) -> List[str]:
+        return [name for statement in self.statements for name in created_table.findall(statement)]
+
+
+created_table = re.compile(r'CREATE TABLE (?:IF NOT EXISTS )?(\w+)')
+
+
+# Tables use IF NOT EXISTS so databases created before migrations existed are adopted, not rebuilt
+migrations = (
+    Migration(
+        1, 'levels',
+        'CREATE TABLE IF NOT EXISTS guild_levels ('
+        'guild_id bigint NOT NULL, user_id bigint NOT NULL, '
+        'experience bigint NOT NULL DEFAULT 0, artificial bigint NOT NULL DEFAULT 0, '
+        'PRIMARY KEY (guild_id, user_id))',
+
+        'CREATE TABLE IF NOT EXISTS user_levels ('
+        'user_id bigint PRIMARY KEY, experience bigint NOT NULL DEFAULT 0)',
+
+        'CREATE TABLE IF NOT EXISTS configs (name text PRIMARY KEY, settings text NOT NULL)'
+    ),
+    Migration(
+        2, 'infractions',
+        'CREATE TABLE IF NOT EXISTS infractions ('
+        'event_id bigserial PRIMARY KEY, guild_id bigint NOT NULL, user_id bigint NOT NULL, '
+        'event_type text NOT NULL, embed text NOT NULL)'
+    ),
+    Migration(
+        3, 'leaderboards-and-history',
+        'CREATE TABLE IF NOT EXISTS leaderboard_snapshots ('
+        'scope bigint PRIMARY KEY, entries jsonb NOT NULL, taken_at timestamptz NOT NULL)',
+
+        'CREATE TABLE IF NOT EXISTS xp_history_hourly ('
+        'guild_id bigint NOT NULL, user_id bigint NOT NULL, bucket timestamptz NOT NULL, '
+        'experience bigint NOT NULL, PRIMARY KEY (guild_id, bucket, user_id))',
+
+        'CREATE TABLE IF NOT EXISTS xp_history_daily ('
+        'guild_id bigint NOT NULL, user_id bigint NOT NULL, bucket timestamptz NOT NULL, '
+        'experience bigint NOT NULL, PRIMARY KEY (guild_id, bucket, user_id))'
+    ),
+    Migration(
+        4, 'hot-query-indexes',
+        # Leaderboards and rank lookups walk these in order instead of sorting the whole guild
+        'CREATE INDEX IF NOT EXISTS guild_levels_rank ON guild_levels (guild_id, experience DESC, user_id)',
+        'CREATE INDEX IF NOT EXISTS user_levels_rank ON user_levels (experience DESC, user_id)',
+
+        'CREATE INDEX IF NOT EXISTS infractions_member ON infractions (user_id, guild_id, event_id DESC)',
+
+        # Per-member gains and the inactivity check - the primary keys lead with the bucket instead
+        'CREATE INDEX IF NOT EXISTS xp_history_hourly_member ON xp_history_hourly (guild_id, user_id, bucket)',
+        'CREATE INDEX IF NOT EXISTS xp_history_daily_member ON xp_history_daily (guild_id, user_id, bucket)',
+
+        # Every message rewrites a levels row and an hourly row - spare room on the page keeps the
+        # new version beside the old one (and HOT for the history, whose counter is not indexed)
+        'ALTER TABLE guild_levels SET (fillfactor = 85)',
+        'ALTER TABLE user_levels SET (fillfactor = 85)',
+        'ALTER TABLE xp_history_hourly SET (fillfactor = 80)'
+    ),
+    Migration(
+        5, 'infraction-counters',
+        # Keyed by user first, so a summary across every guild is still a prefix read
+        'CREATE TABLE IF NOT EXISTS infraction_counters ('
+        'user_id bigint NOT NULL, guild_id bigint NOT NULL, event_type text NOT NULL, '
+        'total integer NOT NULL DEFAULT 0, PRIMARY KEY (user_id, guild_id, event_type))',
+
+        'INSERT INTO infraction_counters (user_id, guild_id, event_type, total) '
+        'SELECT user_id, guild_id, event_type, count(*) FROM infractions GROUP BY 1, 2, 3 '
+        'ON CONFLICT DO NOTHING',
+
+        # History pages across every guild - the member index only orders event ids within one guild
+        'CREATE INDEX IF NOT EXISTS infractions_user_recent ON infractions (user_id, event_id DESC)'
+    ),
+    Migration(
+        6, 'compact-infractions',
+        # Existing rows keep their embed text (and get the migration time as created_at) until
+        # `infractions.API.compact_legacy` rewrites them
+        'ALTER TABLE infractions ADD COLUMN IF NOT EXISTS moderator_id bigint, '
+        'ADD COLUMN IF NOT EXISTS created_at timestamptz NOT NULL DEFAULT now(), '
+        'ADD COLUMN IF NOT EXISTS payload bytea, '
+        'ALTER COLUMN embed DROP NOT NULL',
+
+        'ALTER TABLE infractions ADD CONSTRAINT infractions_body CHECK (payload IS NOT NULL OR embed IS NOT NULL)'
+    ),
+    Migration(
+        7, 'partition-infractions',
+        # Month bounds are computed in UTC whatever the server's zone is
+        'SET LOCAL TimeZone = \'UTC\'',
+
+        'ALTER TABLE infractions RENAME TO infractions_unpartitioned',
+        'ALTER INDEX infractions_pkey RENAME TO infractions_unpartitioned_pkey',
+
+        # The partition key has to be part of the primary key
+        'CREATE TABLE infractions ('
+        'event_id bigint NOT NULL DEFAULT nextval(\'infractions_event_id_seq\'), '
+        'guild_id bigint NOT NULL, user_id bigint NOT NULL, event_type text NOT NULL, moderator_id bigint, '
+        'created_at timestamptz NOT NULL DEFAULT now(), payload bytea, embed text, '
+        'CONSTRAINT infractions_body CHECK (payload IS NOT NULL OR embed IS NOT NULL), '
+        'PRIMARY KEY (event_id, created_at)'
+        ') PARTITION BY RANGE (created_at)',
+
+        'ALTER SEQUENCE infractions_event_id_seq OWNED BY infractions.event_id',
+
+        # Catches anything outside the monthly partitions, so a late `ensure_partitions` never fails a write
+        'CREATE TABLE infractions_default PARTITION OF infractions DEFAULT',
+
+        'DO $$ DECLARE month timestamptz; BEGIN '
+        'FOR month IN SELECT generate_series('
+        'date_trunc(\'month\', coalesce((SELECT min(created_at) FROM infractions_unpartitioned), now())), '
+        'date_trunc(\'month\', now()) + interval \'2 months\', interval \'1 month\') LOOP '
+        'EXECUTE format(\'CREATE TABLE %I PARTITION OF infractions FOR VALUES FROM (%L) TO (%L)\', '
+        '\'infractions_\' || to_char(month, \'YYYY_MM\'), month, month + interval \'1 month\'); '
+        'END LOOP; END $$',
+
+        'INSERT INTO infractions (event_id, guild_id, user_id, event_type, moderator_id, created_at, payload, embed) '
+        'SELECT event_id, guild_id, user_id, event_type, moderator_id, created_at, payload, embed '
+        'FROM infractions_unpartitioned',
+
+        'DROP TABLE infractions_unpartitioned',
+
+        # History pages are keyed on (created_at, event_id) - see the infractions API
+        'CREATE INDEX infractions_member ON infractions (user_id, guild_id, created_at DESC, event_id DESC)',
+        'CREATE INDEX infractions_user_recent ON infractions (user_id, created_at DESC, event_id DESC)'
+    )
+)
+
+
+class HotQuery():
+    ''' A Statement that runs per Message or per Command, with Arguments that hit the Seeded Data '''
+
+    __slots__ = ('name', 'query', 'args')
+
+    def __init__(self, name: str, query: str, args: tuple):
+        self.name = name
+        self.query = query
+        self.args = args
+
+
+def hot_queries() -> List[HotQuery]:
+    levels = leveling.API.statements
+    events = infractions.API.statements
+
+    # Seeded members are spread over 100 guilds; history covers the last 48 hours and 400 days
+    this_month = month_start(datetime.now(timezone.utc))
+
+    queries = [
+        HotQuery('fetch_guild_user', levels["fetch_guild_user"], (7, 1007)),
+        HotQuery('fetch_global_user', levels["fetch_global_user"], (1007, )),
+        HotQuery('fetch_experience', levels["fetch_experience"], (1007, )),
+        HotQuery('overwrite_guild_user', levels["overwrite_guild_user"], (7, 1007, 500, 0)),
+        HotQuery('fetch_guild_leaderboard', levels["fetch_guild_leaderboard"], (7, 10)),
+        HotQuery('fetch_global_leaderboard', levels["fetch_global_leaderboard"], (5000, )),
+        HotQuery('fetch_top_gainers', levels["fetch_top_gainers"], (7, seeded_cutoff(days=7), 10)),
+        HotQuery('fetch_user_gains', levels["fetch_user_gains"], (7, 1007, seeded_cutoff(days=30))),
+
+        HotQuery('fetch_infraction', events["fetch_infraction"], (1007, this_month, latest)),
+        HotQuery('fetch_history', events["fetch_history"], (107, latest, 2 ** 63 - 1, 11)),
+        HotQuery('fetch_guild_history', events["fetch_guild_history"], (107, 7, latest, 2 ** 63 - 1, 11)),
+        HotQuery('fetch_summary', events["fetch_summary"], (107, )),
+        HotQuery('fetch_guild_summary', events["fetch_guild_summary"], (107, 7)),
+        HotQuery('store_event', events["store_event"], (7, 107, 'member_warned', None, b'\x01')),
+        HotQuery('remove_infraction', events["remove_infraction"], (1007, this_month, latest))
+    ]
+
+    return queries
+
+
+def seeded_cutoff(*, days: int) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(days=days)
+
+
+seed_statements = (
+    'INSERT INTO guild_levels (guild_id, user_id, experience, artificial) '
+    'SELECT n % 100, n, (random() * 1000000)::bigint, 0 FROM generate_series(1, $1) AS n '
+    'ON CONFLICT DO NOTHING',
+
+    'INSERT INTO user_levels (user_id, experience) '
+    'SELECT n, (random() * 10000000)::bigint FROM generate_series(1, $1) AS n '
+    'ON CONFLICT DO NOTHING',
+
+    'INSERT INTO infractions (guild_id, user_id, event_type, payload) '
+    'SELECT n % 100, n % greatest($1 / 10, 1), \'member_warned\', \'\\x01\'::bytea FROM generate_series(1, $1) AS n',
+
+    'INSERT INTO infraction_counters (user_id, guild_id, event_type, total) '
+    'SELECT n % greatest($1 / 10, 1), n % 100, \'member_warned\', 1 FROM generate_series(1, $1) AS n '
+    'ON CONFLICT DO NOTHING',
+
+    'INSERT INTO xp_history_hourly (guild_id, user_id, bucket, experience) '
+    'SELECT n % 100, n, date_trunc(\'hour\', now()) - (n % 48) * interval \'1 hour\', 25 '
+    'FROM generate_series(1, $1) AS n ON CONFLICT DO NOTHING',
+
+    'INSERT INTO xp_history_daily (guild_id, user_id, bucket, experience) '
+    'SELECT n % 100, n, date_trunc(\'day\', now(), \'UTC\') - (n % 400) * interval \'1 day\', 600 '
+    'FROM generate_series(1, $1) AS n ON CONFLICT DO NOTHING'
+)
+
+
+def sequential_scans(plan: dict) -> List[str]:
+    ''' Relations read by a Seq Scan anywhere in an EXPLAIN (ANALYZE, FORMAT JSON) plan tree '''
+
+    found = []
+
+    # Scans that neither returned nor filtered out a row read empty relations (upcoming or default
+    # infraction partitions), where no index would be cheaper
+    if plan.get('Node Type') == 'Seq Scan':
+        if plan.get('Actual Rows', 1) or plan.get('Rows Removed by Filter', 0):
+            found.append(plan.get('Relation Name', '?'))
+
+    for child in plan.get('Plans', []):
+        found.extend(sequential_scans(child))
+
+    return found
+
+
+class Migrator(database.Connector):
+    ''' Owns the Schema - Applies Pending Migrations and Checks the Hot Query Plans '''
+
+    def __init__(self, log: Any):
+        self.log = log
+
+        super().__init__(MigrationConfig.role, log)
+
+    @staticmethod
+    def quote(identifier: str) -> str:
+        return '"' + identifier.replace('"', '""') + '"'
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[Any]:
+        ''' A pooled connection whose connection & permission failures are raised as MigrationError '''
+
+        role = self.child
+
+        try:
+            async with self.connect() as connection:
+                yield connection
+
+        except asyncpg.InsufficientPrivilegeError as error:
+            raise MigrationError(f'"{role}" Lacks the Privileges to Change the Schema - {error}')
+
+        except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError,
+                database.PoolExhausted) as error:
+            raise MigrationError(f'Unable to Migrate as "{role}" - {type(error).__name__}: {error}')
+
+    async def foreign_tables(self, connection: Any) -> List[str]:
+        ''' Managed tables another role owns - left over from before migrations existed '''
+
+        managed = sorted({table for migration in migrations for table in migration.tables})
+        rows = await connection.fetch(
+            'SELECT tablename FROM pg_tables WHERE schemaname = \'public\' AND tablename = any($1::text[]) '
+            'AND tableowner <> current_user ORDER BY tablename',
+            managed
+        )
+
+        return [row['tablename'] for row in rows]
+
+    async def applied(self, connection: Any) -> Dict[int, str]:
+        await connection.execute(
+            'CREATE TABLE IF NOT EXISTS schema_migrations ('
+            'version integer PRIMARY KEY, name text NOT NULL, checksum text NOT NULL, '
+            'applied_at timestamptz NOT NULL DEFAULT now())'
+        )
+        rows = await connection.fetch('SELECT version, checksum FROM schema_migrations ORDER BY version')
+
+        return {row['version']: row['checksum'] for row in rows}
+
+    def pending(self, applied: Dict[int, str]) -> List[Migration]:
+        known = {migration.version for migration in migrations}
+
+        for migration in migrations:
+            if migration.version in applied and applied[migration.version] != migration.checksum:
+                raise MigrationError(
+                    f'Migration {migration.version} ({migration.name}) was Edited after it was Applied'
+                )
+
+        unknown = sorted(set(applied) - known)
+        if unknown:
+            self.log.warn('database', f'Schema has Migrations this Release does not Know About: {unknown}')
+
+        return [migration for migration in migrations if migration.version not in applied]
+
+    async def upgrade(self) -> List[Migration]:
+        async with self.session() as connection:
+            # Processes starting together queue here - the second one finds nothing left to apply
+            await connection.execute('SELECT pg_advisory_lock($1)', MigrationConfig.lock_id)
+
+            try:
+                pending = self.pending(await self.applied(connection))
+
+                foreign = await self.foreign_tables(connection) if pending else []
+                if foreign:
+                    owner = self.quote(self.child)
+                    statements = ' '.join(f'ALTER TABLE {self.quote(table)} OWNER TO {owner};' for table in foreign)
+
+                    raise MigrationError(
+                        f'{len(pending)} Pending Migration(s) need Tables owned by Another Role - '
+                        f'run as a Superuser: {statements}'
+                    )
+
+                for migration in pending:
+                    async with connection.transaction():
+                        for statement in migration.statements:
+                            await connection.execute(statement)
+
+                        await connection.execute(
+                            'INSERT INTO schema_migrations (version, name, checksum) VALUES ($1, $2, $3)',
+                            migration.version, migration.name, migration.checksum
+                        )
+
+                    self.log.info('database', f'Applied Migration {migration.version} ({migration.name})')
+
+                for role in MigrationConfig.grants:
+                    await connection.execute(
+                        'GRANT SELECT, INSERT, UPDATE, DELETE, TRUNCATE ON ALL TABLES IN SCHEMA public '
+                        f'TO {self.quote(role)}'
+                    )
+                    await connection.execute(f'GRANT USAGE ON ALL SEQUENCES IN SCHEMA public TO {self.quote(role)}')
+
+            finally:
+                await connection.execute('SELECT pg_advisory_unlock($1)', MigrationConfig.lock_id)
+
+        return pending
+
+    async def status(self) -> List[Tuple[int, str, bool]]:
+        async with self.session() as connection:
+            applied = await self.applied(connection)
+
+        return [(migration.version, migration.name, migration.version in applied) for migration in migrations]
+
+    async def check(self, *, rows: Optional[int] = None) -> Dict[str, List[str]]:
+        ''' Sequentially scanned relations for every hot query - raises SequentialScan if there are any '''
+
+        rows = rows or MigrationConfig.seed_rows
+        failures = {}
+
+        async with self.session() as connection:
+            transaction = connection.transaction()
+            await transaction.start()
+
+            try:
+                for statement in seed_statements:
+                    await connection.execute(statement, rows)
+                await connection.execute(
+                    'ANALYZE guild_levels, user_levels, infractions, infraction_counters, '
+                    'xp_history_hourly, xp_history_daily'
+                )
+
+                # Prepared statements switch to a generic plan after a few executions, so both modes are explained
+                for query in hot_queries():
+                    for mode in ('force_custom_plan', 'force_generic_plan'):
+                        await connection.execute(f'SET LOCAL plan_cache_mode = {mode}')
+
+                        explain = f'EXPLAIN (ANALYZE, FORMAT JSON) {query.query}'
+                        explained = await connection.fetchval(explain, *query.args)
+                        plan = json.loads(explained)[0]["Plan"]
+
+                        scanned = sequential_scans(plan)
+                        if scanned:
+                            failures[f'{query.name} ({mode.split("_")[1]})'] = scanned
+
+                        timing = f'{plan["Node Type"]}, {plan["Actual Total Time"]}ms'
+                        self.log.trace('database', f'{query.name} ({mode}): {timing}')
+
+            finally:
+                await transaction.rollback()
+
+        if failures:
+            details = ', '.join(f'{name} -> {", ".join(relations)}' for name, relations in failures.items())
+            raise SequentialScan(f'Hot Queries Planned Sequential Scans: {details}')
+
+        return failures
+
+
+async def migrate(log: Any) -> List[Migration]:
+    ''' Startup Entry - Brings the Schema up to Date, then Releases the Migration Pool '''
+
+    try:
+        return await Migrator(log).upgrade()
+    finally:
+        await database.PoolManager.close_all()
+
+
+async def main(arguments: argparse.Namespace) -> int:
+    from ..log import logger
+
+    log = logger.getLogger(level='TRACE' if arguments.verbose else 'INFO')
+    migrator = Migrator(log)
+
+    try:
+        if arguments.command == 'status':
+            for version, name, applied in await migrator.status():
+                print(f'{version:>4}  {"applied" if applied else "pending":<8} {name}')
+
+        elif arguments.command == 'check':
+            await migrator.upgrade()
+            await migrator.check(rows=arguments.rows)
+
+            print(f'{len(hot_queries())} Hot Queries Checked - No Sequential Scans')
+
+        else:
+            applied = await migrator.upgrade()
+            print(f'Applied {len(applied)} Migration(s)')
+
+    except (MigrationError, SequentialScan) as error:
+        print(error)
+        return 1
+
+    finally:
+        await database.PoolManager.close_all()
+
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m applications.api.migrations')
+    parser.add_argument('command', nargs='?', default='upgrade', choices=('upgrade', 'status', 'check'))
+    parser.add_argument('--rows', type=int, default=None, help='Rows seeded into each table before `check`')
+    parser.add_argument('--verbose', action='store_true')
+
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,59 @@
+import time
+
+from typing import Any, Optional
+
+
+class ChunkedProgress():
+    ''' Resumable State of one Chunked Bulk Operation over a Guild (or every Guild) '''
+
+    __slots__ = ('guild_id', 'total', 'processed', 'chunks', 'checkpoint', 'started', 'finished')
+
+    def __init__(self, guild_id: Optional[int], *, total: Optional[int] = None):
+        self.guild_id = guild_id
+        self.total = total
+
+        self.processed = 0
+        self.chunks = 0
+
+        # Last key already committed - rows are visited in ascending key order
+        self.checkpoint: Optional[Any] = None
+        self.started = time.monotonic()
+        self.finished = False
+
+    @property
+    def percent(self) -> Optional[float]:
+        if self.total is None:
+            return None
+
+        return 100.0 * self.processed / self.total if self.total else 100.0
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def scope(self) -> str:
+        return f'Guild ID: {self.guild_id}' if self.guild_id else 'All Guilds'
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class OnboardingProgress(ChunkedProgress):
+    ''' Resumable State of one Guild's Bulk Enrollment '''
+
+    __slots__ = ('guild_inserted', 'global_inserted')
+
+    def __init__(self, guild_id: int, *, total: int):
+        super().__init__(guild_id, total=total)
+
+        self.guild_inserted = 0
+        self.global_inserted = 0
+
+    def __str__(self):
+        message = (
+            f'{self.scope} - Processed: {self.processed}/{self.total} ({self.percent:.1f}%) - '
+            f'New Guild Records: {self.guild_inserted} - New Global Records: {self.global_inserted}'
+        )
+
+        return message
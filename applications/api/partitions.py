@@ -0,0 +1,247 @@
+import os
+import json
+import asyncpg
+
+from bisect import bisect_right
+from os.path import abspath, join
+from datetime import datetime, timezone
+from typing import Any, List, Optional, Tuple
+
+from . import database
+from .backup import ChunkWriter
+from ..constants import MigrationConfig, InfractionPartitionConfig
+
+
+# Unbounded ends of a created_at range - asyncpg sends these as -infinity / infinity
+earliest = datetime.min.replace(tzinfo=timezone.utc)
+latest = datetime.max.replace(tzinfo=timezone.utc)
+
+parent = 'infractions'
+default_partition = 'infractions_default'
+
+
+def month_start(moment: datetime, *, offset: int = 0) -> datetime:
+    ''' First instant (UTC) of the month `offset` months away from the one holding `moment` '''
+
+    moment = moment.astimezone(timezone.utc)
+    index = moment.year * 12 + moment.month - 1 + offset
+
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(month: datetime) -> str:
+    return f'{parent}_{month:%Y_%m}'
+
+
+def default_directory() -> str:
+    return abspath(__file__).replace('api/partitions.py', '$tmp/archives/')
+
+
+def quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+class Partition():
+    ''' One Month of Infractions - `first_event` is None while the partition is empty '''
+
+    __slots__ = ('name', 'starts', 'ends', 'first_event')
+
+    def __init__(self, name: str, *, starts: datetime, ends: datetime, first_event: Optional[int]):
+        self.name = name
+        self.starts = starts
+        self.ends = ends
+        self.first_event = first_event
+
+    @classmethod
+    def from_name(cls, name: str, *, first_event: Optional[int]) -> 'Partition':
+        year, month = name[len(parent) + 1:].split('_')
+        starts = datetime(int(year), int(month), 1, tzinfo=timezone.utc)
+
+        return cls(name, starts=starts, ends=month_start(starts, offset=1), first_event=first_event)
+
+    def __repr__(self):
+        return f'<Partition {self.name} from #{self.first_event}>'
+
+
+class PartitionDirectory():
+    ''' Maps Event Ids to the created_at Range that can Hold them '''
+
+    def __init__(self, partitions: List[Partition], *, overflow: bool = False):
+        self.partitions = sorted(partitions, key=lambda partition: partition.starts)
+
+        # Rows in the default partition could belong to any event id, so nothing can be narrowed
+        self.overflow = overflow
+
+        self.populated = [partition for partition in self.partitions if partition.first_event is not None]
+        self.firsts = [partition.first_event for partition in self.populated]
+
+    def __len__(self) -> int:
+        return len(self.partitions)
+
+    def bounds(self, event_id: int) -> Tuple[datetime, datetime]:
+        ''' `(lower, upper)` such that the event, if it exists, has lower <= created_at < upper '''
+
+        if self.overflow or not self.populated:
+            return earliest, latest
+
+        index = bisect_right(self.firsts, event_id) - 1
+        if index < 0:
+            return earliest, self.populated[0].ends
+
+        # Ids are drawn before created_at is stamped, so concurrent writers can commit slightly out of id
+        # order around a month boundary - the populated months either side absorb that. A stale directory
+        # only widens the range, since the newest month is always covered by the open upper bound
+        lower = self.populated[index - 1].starts if index > 0 else earliest
+        upper = self.populated[index + 1].ends if index + 1 < len(self.populated) else latest
+
+        return lower, upper
+
+    def expired(self, cutoff: datetime) -> List[Partition]:
+        ''' Months that ended on or before `cutoff`, oldest first '''
+
+        return [partition for partition in self.partitions if partition.ends <= cutoff]
+
+
+async def load_directory(connection: asyncpg.Connection) -> PartitionDirectory:
+    ''' Reads the attached partitions and the first event id stored in each (an index lookup apiece) '''
+
+    names = await connection.fetch(
+        'SELECT child.relname AS name FROM pg_inherits '
+        'JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid '
+        'WHERE pg_inherits.inhparent = $1::regclass',
+        parent
+    )
+    if not names:
+        return PartitionDirectory([])
+
+    firsts = await connection.fetch(' UNION ALL '.join(
+        f'SELECT {index} AS position, (SELECT min(event_id) FROM ONLY {quote(record["name"])}) AS first_event'
+        for index, record in enumerate(names)
+    ))
+
+    partitions, overflow = [], False
+    for record in firsts:
+        name = names[record['position']]['name']
+
+        if name == default_partition:
+            overflow = record['first_event'] is not None
+            continue
+
+        try:
+            partitions.append(Partition.from_name(name, first_event=record['first_event']))
+        except ValueError:
+            # Not one of ours - it still holds rows, so nothing can be ruled out
+            overflow = True
+
+    return PartitionDirectory(partitions, overflow=overflow)
+
+
+class PartitionManager(database.Connector):
+    ''' Creates Upcoming Months, then Archives and Drops Expired ones - Runs as the Schema Owner '''
+
+    def __init__(self, log: Any, *, directory: Optional[str] = None):
+        self.log = log
+        self.directory = directory or default_directory()
+
+        super().__init__(MigrationConfig.role, log)
+
+    async def ensure_partitions(self, *, lookahead: Optional[int] = None, now: Optional[datetime] = None) -> List[str]:
+        ''' Makes sure this month and the next `lookahead` months have a partition - returns the new ones '''
+
+        lookahead = InfractionPartitionConfig.lookahead_months if lookahead is None else lookahead
+        now = now or datetime.now(timezone.utc)
+        created = []
+
+        async with self.connect() as connection:
+            existing = {partition.name for partition in (await load_directory(connection)).partitions}
+
+            for offset in range(lookahead + 1):
+                starts = month_start(now, offset=offset)
+                name = partition_name(starts)
+
+                if name in existing:
+                    continue
+
+                try:
+                    ends = month_start(starts, offset=1)
+
+                    await connection.execute(
+                        f'CREATE TABLE IF NOT EXISTS {quote(name)} PARTITION OF {parent} '
+                        f'FOR VALUES FROM (\'{starts.isoformat()}\') TO (\'{ends.isoformat()}\')'
+                    )
+                except asyncpg.PostgresError as error:
+                    # Only possible if rows for this month already landed in the default partition
+                    self.log.error('database', f'Unable to Create Partition {name} - {error}')
+                    continue
+
+                created.append(name)
+
+        if created:
+            self.log.info('database', f'Created Infraction Partitions: {", ".join(created)}')
+
+        return created
+
+    async def archive(self, connection: asyncpg.Connection, partition: Partition) -> dict:
+        ''' Writes a partition to a compressed binary COPY file, with a manifest beside it '''
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        columns = await connection.fetch(
+            'SELECT attname FROM pg_attribute WHERE attrelid = $1::regclass AND attnum > 0 AND NOT attisdropped '
+            'ORDER BY attnum',
+            partition.name
+        )
+
+        path = join(self.directory, f'{partition.name}.bin.gz')
+        writer = ChunkWriter(path, level=InfractionPartitionConfig.compression)
+        try:
+            status = await connection.copy_from_table(partition.name, output=writer.write, format='binary')
+        finally:
+            writer.close()
+
+        manifest = {
+            "table": partition.name,
+            "starts": partition.starts.isoformat(),
+            "ends": partition.ends.isoformat(),
+            "columns": [column['attname'] for column in columns],
+            "format": 'binary+gzip',
+            "rows": int(status.split()[-1]),
+            "bytes": writer.size,
+            "sha256": writer.digest.hexdigest()
+        }
+
+        target = join(self.directory, f'{partition.name}.json')
+        with open(target + '.partial', 'w', encoding='UTF-8') as file:
+            json.dump(manifest, file, indent=4)
+
+        os.replace(target + '.partial', target)
+
+        return manifest
+
+    async def expire_partitions(self, *, retention: Optional[int] = None, now: Optional[datetime] = None) -> List[str]:
+        ''' Archives, detaches and drops every month older than `retention` months - returns their names '''
+
+        retention = InfractionPartitionConfig.retention_months if retention is None else retention
+        cutoff = month_start(now or datetime.now(timezone.utc), offset=-retention)
+        dropped = []
+
+        async with self.connect() as connection:
+            for partition in (await load_directory(connection)).expired(cutoff):
+                # Only dropped once its archive is on disk - the counters lose its events in the same transaction
+                manifest = await self.archive(connection, partition)
+
+                async with connection.transaction():
+                    await connection.execute(f'ALTER TABLE {parent} DETACH PARTITION {quote(partition.name)}')
+                    await connection.execute(
+                        'UPDATE infraction_counters AS counters SET total = counters.total - expired.total '
+                        f'FROM (SELECT user_id, guild_id, event_type, count(*) AS total FROM {quote(partition.name)} '
+                        'GROUP BY 1, 2, 3) AS expired '
+                        'WHERE counters.user_id = expired.user_id AND counters.guild_id = expired.guild_id '
+                        'AND counters.event_type = expired.event_type'
+                    )
+                    await connection.execute(f'DROP TABLE {quote(partition.name)}')
+
+                dropped.append(partition.name)
+                self.log.info('database', f'Archived and Dropped {partition.name} ({manifest["rows"]} Infractions)')
+
+        return dropped
@@ -0,0 +1,268 @@
+import json
+import hashlib
+
+from types import MappingProxyType
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from . import ConfigurationError
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class Ladder():
+    ''' One Compiled Set of Ascending Thresholds, with the Label for each Bracket '''
+
+    __slots__ = ('bounds', 'labels', 'finished')
+
+    def __init__(self, bounds: List[int], labels: List[Any], *, finished: Any):
+        self.bounds = tuple(bounds)
+        self.labels = tuple(labels)
+
+        # Shared by every value in the top bracket, since nothing about it depends on the value
+        self.finished = finished
+
+    def locate(self, value: int) -> Tuple[int, Optional[int], Optional[int]]:
+        ''' Same contract as `API._iterate` - (bracket, next bracket, distance to it) '''
+
+        current = bisect_right(self.bounds, value) - 1
+
+        if current + 1 < len(self.bounds):
+            return current, current + 1, self.bounds[current + 1] - value
+
+        return current, None, None
+
+
+class ProgressionTable():
+    ''' Leveling Configuration Compiled into Bisect-Ready Threshold Tables '''
+
+    # Base levels repeat within every 50k of experience until the first master bound
+    cycle = 50000
+
+    def __init__(self, config: dict, *, statistic: type, version: int = 1):
+        self.validate(config)
+
+        # Read-only once built - a reload compiles a new table, and an unchanged fingerprint skips the swap
+        self.version = version
+        self.fingerprint = hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+        self.statistic = statistic
+
+        self.prestiges = self._compile(
+            config["Prestiges"]["Bounds"], config["Prestiges"]["Names"], 'Max Prestige Reached!'
+        )
+        self.leagues = self._compile(config["Leagues"]["Bounds"], config["Leagues"]["Names"], 'Max League Achieved!')
+        self.boosts = self._compile(config["Boosts"]["Bounds"], config["Boosts"]["Values"], 'Max Boost Earned!')
+
+        levels = config["Levels"]
+        self.level_sets = MappingProxyType({key: tuple(levels[key]) for key in ('0', '1', '2')})
+        self.set_bounds = (levels["1"][0], levels["2"][0])
+
+        # Distance to the next bracket once every level in a set has been cleared
+        self.set_ceilings = MappingProxyType({'0': self.cycle, '1': levels["2"][0], '2': None})
+
+        longest = max(len(bounds) for bounds in self.level_sets.values())
+        self.level_names = tuple(f'Level {i}' for i in range(longest + 2))
+
+        self.frozen = True
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if getattr(self, 'frozen', False):
+            raise AttributeError(f'ProgressionTable is read-only - compile a new table to change "{name}"')
+
+        super().__setattr__(name, value)
+
+    @classmethod
+    def validate(cls, config: dict) -> None:
+        ''' Raises ConfigurationError for anything the threshold tables cannot be built from '''
+
+        def ascending(values: List[int]) -> bool:
+            return all(a < b for a, b in zip(values, values[1:]))
+
+        try:
+            ladders = (
+                ('Prestiges', config["Prestiges"]["Bounds"], config["Prestiges"]["Names"]),
+                ('Leagues', config["Leagues"]["Bounds"], config["Leagues"]["Names"]),
+                ('Boosts', config["Boosts"]["Bounds"], config["Boosts"]["Values"])
+            )
+            levels = [config["Levels"][key] for key in ('0', '1', '2')]
+        except (KeyError, TypeError) as error:
+            raise ConfigurationError(f'Leveling Configuration is Missing {error}')
+
+        for name, bounds, labels in ladders:
+            if not bounds or len(bounds) != len(labels):
+                raise ConfigurationError(f'{name} needs one label for every bound')
+            if bounds[0] != 0 or not ascending(bounds):
+                raise ConfigurationError(f'{name} bounds must start at 0 and strictly increase')
+
+        for key, bounds in zip(('0', '1', '2'), levels):
+            if not bounds or not ascending(bounds):
+                raise ConfigurationError(f'Level Set {key} must be a non-empty, strictly increasing list')
+
+        if levels[0][-1] >= cls.cycle or not levels[0][-1] < levels[1][0] < levels[2][0]:
+            raise ConfigurationError(f'Level Sets must not overlap (base levels repeat every {cls.cycle} XP)')
+
+    def _compile(self, bounds: List[int], labels: List[Any], finished: str) -> Ladder:
+        statistic = self.statistic(current=labels[len(bounds) - 1], next=finished, remaining=finished)
+
+        return Ladder(bounds, labels, finished=statistic)
+
+    def _convert(self, ladder: Ladder, value: int) -> Any:
+        current, next, remaining = ladder.locate(value)
+
+        if next is None:
+            return ladder.finished
+
+        return self.statistic(current=ladder.labels[current], next=ladder.labels[next], remaining=remaining)
+
+    def prestige(self, xp: int) -> Any:
+        return self._convert(self.prestiges, xp)
+
+    def league(self, xp: int) -> Any:
+        return self._convert(self.leagues, xp)
+
+    def boost(self, xp: int) -> Any:
+        return self._convert(self.boosts, xp)
+
+    def level_set(self, xp: int) -> str:
+        if xp < self.set_bounds[0]:
+            return '0'
+        elif xp < self.set_bounds[1]:
+            return '1'
+        else:
+            return '2'
+
+    def level(self, xp: int, level_set: Optional[str] = None) -> Any:
+        if not level_set:
+            level_set = self.level_set(xp)
+        if level_set == '0':
+            xp %= self.cycle
+
+        bounds = self.level_sets[level_set]
+        cleared = bisect_right(bounds, xp)
+
+        if cleared < len(bounds):
+            next = self.level_names[cleared + 1]
+            remaining = bounds[cleared] - xp
+        else:
+            next = 'Prestige Available Soon ...'
+            ceiling = self.set_ceilings[level_set]
+            remaining = ceiling - xp if ceiling else 'Max Level Reached!'
+
+        return self.statistic(current=self.level_names[cleared], next=next, remaining=remaining)
+
+    # Region: Bulk Conversion
+
+    # Below this many rows the NumPy call overhead costs more than the Python loop it replaces
+    vectorize_threshold = 64
+
+    # `level` is the cleared level number, the other indexes are positions in their configured bounds and
+    # `boost` is the boost value itself. None as a remaining value marks the top bracket
+    columns = (
+        'level_set', 'level', 'level_remaining',
+        'prestige', 'prestige_remaining',
+        'league', 'league_remaining',
+        'boost', 'boost_remaining'
+    )
+
+    def convert_many(self, experience: Sequence[int], *, vectorized: Optional[bool] = None) -> Dict[str, list]:
+        ''' Converts a column of experience values into the index/remaining `columns` '''
+
+        if vectorized is None:
+            vectorized = numpy is not None and len(experience) >= self.vectorize_threshold
+
+        if vectorized:
+            if numpy is None:
+                raise RuntimeError('NumPy is not installed - use `vectorized=False`')
+
+            return self._convert_vectorized(experience)
+
+        return self._convert_python(experience)
+
+    def _convert_python(self, experience: Sequence[int]) -> Dict[str, list]:
+        results = {column: [] for column in self.columns}
+
+        for xp in experience:
+            level_set = self.level_set(xp)
+            bounds = self.level_sets[level_set]
+            value = xp % self.cycle if level_set == '0' else xp
+
+            cleared = bisect_right(bounds, value)
+            if cleared < len(bounds):
+                level_remaining = bounds[cleared] - value
+            else:
+                ceiling = self.set_ceilings[level_set]
+                level_remaining = ceiling - value if ceiling else None
+
+            results['level_set'].append(int(level_set))
+            results['level'].append(cleared)
+            results['level_remaining'].append(level_remaining)
+
+            for name, ladder in (('prestige', self.prestiges), ('league', self.leagues), ('boost', self.boosts)):
+                current, _, remaining = ladder.locate(xp)
+
+                results[name].append(ladder.labels[current] if name == 'boost' else current)
+                results[f'{name}_remaining'].append(remaining)
+
+        return results
+
+    @staticmethod
+    def _with_missing(values: Any, missing: Any) -> list:
+        return [None if absent else value for value, absent in zip(values.tolist(), missing.tolist())]
+
+    def _convert_vectorized(self, experience: Sequence[int]) -> Dict[str, list]:
+        xp = numpy.asarray(experience, dtype=numpy.int64)
+        results = {}
+
+        level_sets = numpy.searchsorted(numpy.asarray(self.set_bounds, dtype=numpy.int64), xp, side='right')
+        values = numpy.where(level_sets == 0, xp % self.cycle, xp)
+
+        cleared = numpy.zeros(len(xp), dtype=numpy.int64)
+        level_remaining = numpy.zeros(len(xp), dtype=numpy.int64)
+        level_missing = numpy.zeros(len(xp), dtype=bool)
+
+        for key, bounds in self.level_sets.items():
+            mask = level_sets == int(key)
+            if not mask.any():
+                continue
+
+            bounds = numpy.asarray(bounds, dtype=numpy.int64)
+            positions = numpy.searchsorted(bounds, values[mask], side='right')
+            inside = positions < len(bounds)
+
+            ceiling = self.set_ceilings[key]
+            distances = numpy.where(
+                inside,
+                bounds[numpy.minimum(positions, len(bounds) - 1)] - values[mask],
+                (ceiling or 0) - values[mask]
+            )
+
+            cleared[mask] = positions
+            level_remaining[mask] = distances
+            level_missing[mask] = ~inside if ceiling is None else False
+
+        results['level_set'] = level_sets.tolist()
+        results['level'] = cleared.tolist()
+        results['level_remaining'] = self._with_missing(level_remaining, level_missing)
+
+        for name, ladder in (('prestige', self.prestiges), ('league', self.leagues), ('boost', self.boosts)):
+            bounds = numpy.asarray(ladder.bounds, dtype=numpy.int64)
+
+            current = numpy.searchsorted(bounds, xp, side='right') - 1
+            following = current + 1
+            top = following >= len(bounds)
+
+            remaining = bounds[numpy.minimum(following, len(bounds) - 1)] - xp
+
+            if name == 'boost':
+                results[name] = numpy.asarray(ladder.labels)[current].tolist()
+            else:
+                results[name] = current.tolist()
+
+            results[f'{name}_remaining'] = self._with_missing(remaining, top)
+
+        return results
+
+    # End Region
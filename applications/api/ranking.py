@@ -0,0 +1,177 @@
+from bisect import bisect_left, insort
+from typing import Dict, List, Tuple, Optional, Iterable
+
+
+class FenwickTree():
+    ''' Prefix Sums over a List of Counts - O(log n) Updates and Lookups '''
+
+    __slots__ = ('tree', )
+
+    def __init__(self, counts: Iterable[int] = ()):
+        self.tree = list(counts)
+
+        for i in range(len(self.tree)):
+            parent = i | (i + 1)
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[i]
+
+    def __len__(self) -> int:
+        return len(self.tree)
+
+    def adjust(self, index: int, amount: int) -> None:
+        while index < len(self.tree):
+            self.tree[index] += amount
+            index |= index + 1
+
+    def preceding(self, index: int) -> int:
+        ''' Sum of the counts before `index` '''
+
+        total = 0
+        while index > 0:
+            total += self.tree[index - 1]
+            index &= index - 1
+
+        return total
+
+
+class RankIndex():
+    ''' Order-Statistic Index of Members by Experience (Highest First) '''
+
+    load = 512
+
+    def __init__(self, scores: Optional[Iterable[Tuple[int, int]]] = None):
+        self.scores: Dict[int, int] = {}
+
+        # Sorted buckets of at most `2 * load` `(-experience, member_id)` keys, with a Fenwick tree over their
+        # sizes - locating a member and counting those ahead are O(log n), an insert shifts one bucket
+        self.buckets: List[List[Tuple[int, int]]] = []
+        self.maxes: List[Tuple[int, int]] = []
+        self.tree = FenwickTree()
+
+        if scores:
+            self.load_scores(scores)
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def __contains__(self, member: int) -> bool:
+        return member in self.scores
+
+    def load_scores(self, scores: Iterable[Tuple[int, int]]) -> None:
+        self.scores = dict(scores)
+
+        keys = sorted((-experience, member) for member, experience in self.scores.items())
+        self.buckets = [keys[i:i + self.load] for i in range(0, len(keys), self.load)]
+        self.maxes = [bucket[-1] for bucket in self.buckets]
+
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        self.tree = FenwickTree(len(bucket) for bucket in self.buckets)
+
+    def _insert(self, key: Tuple[int, int]) -> None:
+        if not self.buckets:
+            self.buckets.append([key])
+            self.maxes.append(key)
+
+            return self._rebuild()
+
+        index = min(bisect_left(self.maxes, key), len(self.buckets) - 1)
+        bucket = self.buckets[index]
+
+        insort(bucket, key)
+        self.maxes[index] = bucket[-1]
+
+        if len(bucket) > 2 * self.load:
+            self.buckets[index:index + 1] = [bucket[:self.load], bucket[self.load:]]
+            self.maxes[index:index + 1] = [bucket[self.load - 1], bucket[-1]]
+            self._rebuild()
+        else:
+            self.tree.adjust(index, 1)
+
+    def _remove(self, key: Tuple[int, int]) -> None:
+        index = bisect_left(self.maxes, key)
+        bucket = self.buckets[index]
+
+        del bucket[bisect_left(bucket, key)]
+
+        if not bucket:
+            del self.buckets[index]
+            del self.maxes[index]
+            self._rebuild()
+        else:
+            self.maxes[index] = bucket[-1]
+            self.tree.adjust(index, -1)
+
+    def update(self, member: int, experience: int) -> None:
+        previous = self.scores.get(member)
+        if previous == experience:
+            return
+
+        if previous is not None:
+            self._remove((-previous, member))
+
+        self.scores[member] = experience
+        self._insert((-experience, member))
+
+    def increment(self, member: int, amount: int) -> None:
+        self.update(member, self.scores.get(member, 0) + amount)
+
+    def discard(self, member: int) -> None:
+        previous = self.scores.pop(member, None)
+
+        if previous is not None:
+            self._remove((-previous, member))
+
+    def lowest(self) -> Optional[int]:
+        ''' Experience of the last-ranked member '''
+
+        if not self.buckets:
+            return None
+
+        return -self.buckets[-1][-1][0]
+
+    def trim(self, size: int) -> List[int]:
+        ''' Drops the lowest-ranked members until at most `size` remain '''
+
+        removed = []
+        while len(self.scores) > size:
+            _, member = self.buckets[-1][-1]
+
+            self.discard(member)
+            removed.append(member)
+
+        return removed
+
+    def rank(self, member: int) -> Optional[int]:
+        ''' 1-based position of `member`, ties broken by the lower member id '''
+
+        experience = self.scores.get(member)
+        if experience is None:
+            return None
+
+        key = (-experience, member)
+        index = bisect_left(self.maxes, key)
+
+        return self.tree.preceding(index) + bisect_left(self.buckets[index], key) + 1
+
+    def top(self, limit: int, *, offset: int = 0) -> List[Tuple[int, int]]:
+        ''' `(member_id, experience)` pairs for positions `offset + 1` through `offset + limit` '''
+
+        results = []
+        skipped = 0
+
+        for bucket in self.buckets:
+            if skipped + len(bucket) <= offset:
+                skipped += len(bucket)
+                continue
+
+            for negative, member in bucket[max(offset - skipped, 0):]:
+                results.append((member, -negative))
+
+                if len(results) >= limit:
+                    return results
+
+            skipped += len(bucket)
+
+        return results
@@ -0,0 +1,134 @@
+import json
+import zlib
+
+from datetime import datetime
+from discord import Embed
+from typing import Any, Dict, Optional
+
+from ..constants import EventConfig
+
+
+# Preset deflate dictionaries - a payload names the one it was packed with in its first byte, so a
+# dictionary may never change once used; add a new version instead. Likelier strings go last.
+dictionaries = {
+    1: (
+        b'"inline":false"inline":true"type":"rich""url":"https://discordapp.com/channels/'
+        b'"icon_url":"https://cdn.discordapp.com/attachments/""thumbnail":{"footer":{"text":"Provided By SimplySavant"}'
+        b'"author":{"name":"Project S""fields":[{"name":"value":"color":"title":"Event Logging --> '
+        b'"description":"A __ Event was triggered by: <@Moderator Influence: Event Duration: Event Details: \\n'
+        b'**Original:** ```**Updated:** ``` Member Warned Member Muted Member Kicked Member Banned Permanent None'
+        b'{"embed":{"duration":"None","reason":"'
+    )
+}
+
+payload_version = 1
+
+
+def pack(details: Dict[str, Any]) -> bytes:
+    ''' Compact JSON, deflated against the current preset dictionary '''
+
+    raw = json.dumps(details, separators=(',', ':')).encode()
+
+    # Raw deflate (negative wbits) - the zlib header and checksum would be a large share of a short payload
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=dictionaries[payload_version])
+
+    return bytes((payload_version, )) + compressor.compress(raw) + compressor.flush()
+
+
+def unpack(payload: bytes) -> Dict[str, Any]:
+    decompressor = zlib.decompressobj(-15, zdict=dictionaries[payload[0]])
+
+    return json.loads(decompressor.decompress(payload[1:]) + decompressor.flush())
+
+
+def render_report(event: str, *, user: str, moderator: Optional[str], duration: Any, reason: Any) -> Embed:
+    ''' The standard event report - `user` and `moderator` are mentions '''
+
+    color = getattr(EventConfig, event, 0x00ff00)
+    event = event.replace('_', ' ').title()
+
+    embed = Embed(
+        title = f'Event Logging --> {event}',
+        color = color,
+        description = (
+            f'A __{event}__ Event was triggered by: {user} \n\n'
+            f'Moderator Influence: {moderator or "None"}\n'
+            f'Event Duration: {duration}\n\n'
+            f'Event Details: \n{reason}'
+        )
+    )
+
+    return embed
+
+
+class InfractionRecord():
+    ''' One Stored Infraction - Decoded and Rendered only when Read '''
+
+    __slots__ = (
+        'event_id', 'guild_id', 'user_id', 'event_type', 'moderator_id', 'created_at', 'payload', 'legacy', '_details'
+    )
+
+    def __init__(self, *, event_id: int, guild_id: int, user_id: int, event_type: str, moderator_id: Optional[int],
+                 created_at: Optional[datetime], payload: Optional[bytes], legacy: Optional[str] = None):
+        self.event_id = event_id
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.event_type = event_type
+        self.moderator_id = moderator_id
+        self.created_at = created_at
+
+        # Rows written before payloads existed carry their full embed as JSON text in `legacy`
+        self.payload = payload
+        self.legacy = legacy
+
+        # Decompressed on the first `details` read, so listing a history never unpacks a payload
+        self._details = None
+
+    @classmethod
+    def from_record(cls, record: Any) -> 'InfractionRecord':
+        return cls(
+            event_id = record['event_id'],
+            guild_id = record['guild_id'],
+            user_id = record['user_id'],
+            event_type = record['event_type'],
+            moderator_id = record['moderator_id'],
+            created_at = record['created_at'],
+            payload = record['payload'],
+            legacy = record['embed']
+        )
+
+    @property
+    def details(self) -> Dict[str, Any]:
+        ''' `{"duration", "reason"}` for templated reports, `{"embed": ...}` for custom ones '''
+
+        if self._details is None:
+            if self.payload is not None:
+                self._details = unpack(self.payload)
+            else:
+                self._details = {"embed": json.loads(self.legacy)}
+
+        return self._details
+
+    @property
+    def reason(self) -> Optional[str]:
+        return self.details.get('reason')
+
+    def embed(self) -> Embed:
+        details = self.details
+
+        if 'embed' in details:
+            return Embed.from_dict(details['embed'])
+
+        return render_report(
+            self.event_type,
+            user = f'<@{self.user_id}>',
+            moderator = f'<@{self.moderator_id}>' if self.moderator_id else None,
+            duration = details.get('duration'),
+            reason = details.get('reason')
+        )
+
+    def __str__(self):
+        return f'Case #{self.event_id} - {self.event_type} against {self.user_id} in {self.guild_id}'
+
+    def __repr__(self):
+        return self.__str__()
@@ -159,7 +159,8 @@ class API():
                 return self.log.error('scheduler', status_msg.format(event.job_id, event.exception))
 
     async def schedule(self, task: Union[str, TaskPayload],
-                       *, id: Optional[str], time: Union[datetime, int, str], args: tuple = (), kwargs: dict = {}) -> str:
+                       *, id: Optional[str], time: Union[datetime, int, str],
+                       args: tuple = (), kwargs: dict = {}) -> str:
 
         if not isinstance(task, TaskPayload):
             task = self.create_task(id, task, args=args, kwargs=kwargs)
@@ -0,0 +1,118 @@
+from bisect import bisect_right
+from typing import List, Tuple, Optional, Iterable
+
+from .ranking import FenwickTree
+
+
+class ExperienceHistogram():
+    ''' Mergeable Log-Bucketed Histogram of an Experience Distribution '''
+
+    def __init__(self, *, base: float, limit: int = 2 ** 62):
+        self.base = base
+
+        # Bucket `i` holds `[bounds[i - 1], bounds[i])`, each bound at most `base` times the one before - integer
+        # bounds, so the smallest values get exact buckets. A fixed ~2k buckets (base 1.02) keeps every update and
+        # estimate constant work
+        bounds = [1]
+        while bounds[-1] < limit:
+            bounds.append(max(bounds[-1] + 1, int(bounds[-1] * base)))
+
+        self.bounds: Tuple[int, ...] = tuple(bounds)
+        self.counts: List[int] = [0] * (len(bounds) + 1)
+        self.tree = FenwickTree(self.counts)
+        self.total = 0
+
+    def __len__(self) -> int:
+        return self.total
+
+    def bucket(self, value: int) -> int:
+        return bisect_right(self.bounds, value)
+
+    def range(self, bucket: int) -> Tuple[int, Optional[int]]:
+        ''' Lowest value in `bucket` and the first value past it (None for the open top bucket) '''
+
+        low = self.bounds[bucket - 1] if bucket else 0
+        high = self.bounds[bucket] if bucket < len(self.bounds) else None
+
+        return low, high
+
+    def load_counts(self, counts: Iterable[Tuple[int, int]]) -> None:
+        ''' Replaces the distribution with `(bucket, count)` pairs - e.g. from a SQL `width_bucket` GROUP BY '''
+
+        self.counts = [0] * len(self.counts)
+        for bucket, count in counts:
+            self.counts[bucket] += count
+
+        self.total = sum(self.counts)
+        self.tree = FenwickTree(self.counts)
+
+    def add(self, value: int, count: int = 1) -> None:
+        bucket = self.bucket(value)
+
+        # A value the histogram never saw (e.g. written between a warm-up and a change) must not go negative
+        count = max(count, -self.counts[bucket])
+
+        self.counts[bucket] += count
+        self.total += count
+        self.tree.adjust(bucket, count)
+
+    def discard(self, value: int) -> None:
+        self.add(value, -1)
+
+    def move(self, before: int, after: int) -> None:
+        if self.bucket(before) != self.bucket(after):
+            self.discard(before)
+            self.add(after)
+
+    def merge(self, other: 'ExperienceHistogram') -> None:
+        if other.bounds != self.bounds:
+            raise ValueError('Cannot merge histograms with different bucket bounds')
+
+        self.load_counts(enumerate(a + b for a, b in zip(self.counts, other.counts)))
+
+    def above(self, value: int) -> int:
+        ''' Number of values in buckets strictly above the one holding `value` '''
+
+        return self.total - self.tree.preceding(self.bucket(value) + 1)
+
+    def estimate_rank(self, value: int) -> int:
+        ''' 1-based position of `value`, interpolated linearly inside its bucket '''
+
+        bucket = self.bucket(value)
+        ahead = self.above(value)
+
+        low, high = self.range(bucket)
+        if high is None or high - low <= 1:
+            return ahead + 1
+
+        # Share of the bucket expected to sit above `value`, if its members were spread evenly
+        share = (high - 1 - value) / (high - 1 - low)
+
+        return ahead + int(share * max(self.counts[bucket] - 1, 0)) + 1
+
+    def percentile(self, value: int) -> float:
+        ''' The "top X%" a value falls in '''
+
+        if not self.total:
+            return 100.0
+
+        return min(100.0 * self.estimate_rank(value) / self.total, 100.0)
+
+    def error_bound(self, value: int) -> int:
+        ''' Worst-case distance between the estimated and the exact rank of `value` '''
+
+        # Only the bucket is known, so every other member within a factor of `base` could be on either side
+        return max(self.counts[self.bucket(value)] - 1, 0)
+
+    def stats(self) -> dict:
+        occupied = sum(1 for count in self.counts if count)
+
+        stats = {
+            "base": self.base,
+            "total": self.total,
+            "buckets": len(self.counts),
+            "occupied": occupied,
+            "largest_bucket": max(self.counts) if self.counts else 0
+        }
+
+        return stats
@@ -1,16 +1,18 @@
 import json
+import asyncio
 import aiohttp
 
 from discord.ext import commands
 from discord import LoginFailure
 from discord import Embed, Message
-from typing import Any, Union, Optional, List
+from typing import Any, Dict, Union, Optional, List
 from discord import Webhook, AsyncWebhookAdapter
 
 from .cogs import ExtensionHandler
 from ..api import infractions, database
+from ..api.buffers import BatchWindow
 
-from ..constants import BotConfig, Webhooks, EventConfig
+from ..constants import BotConfig, Webhooks, EventConfig, EventBatchConfig
 
 
 # Webhook Configuration
@@ -29,6 +31,14 @@ class DiscordBot(commands.Bot, infractions.API):
         infractions.API.__init__(self, log)
         database.Connector.__init__(self, 'discord-bot', log)
 
+        # Reports bound for the same log channel within one window go out as one multi-embed message
+        self.webhook_session: Optional[aiohttp.ClientSession] = None
+        self.webhook_batch = BatchWindow(
+            self.dispatch_webhooks,
+            window = EventBatchConfig.window,
+            max_batch = EventBatchConfig.max_batch
+        )
+
     @staticmethod
     async def dispatch_webhook(*, url: str, message: Union[str, Embed]) -> Optional[Message]:
         if isinstance(message, Embed):
@@ -47,6 +57,65 @@ class DiscordBot(commands.Bot, infractions.API):
 
         return sent
 
+    async def dispatch_webhooks(self, reports: List[tuple]) -> List[Optional[Message]]:
+        ''' Sends `(url, embed)` pairs grouped by url, up to `EventBatchConfig.max_embeds` embeds per message '''
+
+        if self.webhook_session is None or self.webhook_session.closed:
+            self.webhook_session = aiohttp.ClientSession()
+
+        channels: Dict[str, List[int]] = {}
+        for index, (url, _) in enumerate(reports):
+            channels.setdefault(url, []).append(index)
+
+        results: List[Union[Message, BaseException, None]] = [None] * len(reports)
+        delivered = set()
+
+        async def send(url: str, indexes: List[int]) -> None:
+            webhook = Webhook.from_url(url, adapter=AsyncWebhookAdapter(self.webhook_session))
+
+            for start in range(0, len(indexes), EventBatchConfig.max_embeds):
+                chunk = indexes[start:start + EventBatchConfig.max_embeds]
+                embeds = [reports[index][1] for index in chunk]
+
+                for embed in embeds:
+                    embed.set_author(name=webhook_name, icon_url=webhook_pfp)
+                    embed.set_footer(text='Provided By SimplySavant')
+
+                sent = await webhook.send(embeds=embeds, username=webhook_name, avatar_url=webhook_pfp)
+                for index in chunk:
+                    results[index] = sent
+                    delivered.add(index)
+
+        # Channels are independent - only messages within one channel have to keep their order
+        sends = [send(url, indexes) for url, indexes in channels.items()]
+        outcomes = await asyncio.gather(*sends, return_exceptions=True)
+
+        # A failing channel only fails its own reports that were not sent yet
+        for indexes, outcome in zip(channels.values(), outcomes):
+            if isinstance(outcome, BaseException):
+                for index in indexes:
+                    if index not in delivered:
+                        results[index] = outcome
+
+        return results
+
+    async def close(self) -> None:
+        # Cogs holding write-behind state get a last chance to flush before the pools go away
+        for cog in list(self.cogs.values()):
+            if hasattr(cog, 'shutdown'):
+                await cog.shutdown()
+
+        await commands.Bot.close(self)
+
+        # Anything still waiting in a batch window is stored and sent before the pools go away
+        await self.event_batch.drain()
+        await self.webhook_batch.drain()
+
+        if self.webhook_session is not None:
+            await self.webhook_session.close()
+
+        await database.PoolManager.close_all()
+
     async def update_config(self) -> None:
         query = 'SELECT settings FROM configs WHERE name = $1'
         args = ('discord-bot', )
@@ -70,9 +139,10 @@ class DiscordBot(commands.Bot, infractions.API):
         else:
             url = log
 
-        return await self.dispatch_webhook(url=url, message=report)
+        return await self.webhook_batch.submit((url, report))
 
-    async def record_search(self, *, case: Optional[int], guild: Optional[int], user: Optional[int]) -> Union[Embed, List]:
+    async def record_search(self, *, case: Optional[int], guild: Optional[int],
+                            user: Optional[int]) -> Union[Embed, List]:
         if case:
             result = await super().fetch_infraction(id=case)
 
@@ -1,7 +1,9 @@
 from typing import Optional
+from discord.ext import tasks
 from discord.ext import commands
 from discord import Member, Message
 
+from ...api.partitions import PartitionManager
 from ...constants import Webhooks
 from ..utils.embeds import ModerationEmbeds
 
@@ -12,6 +14,24 @@ class InfractionCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    def cog_unload(self):
+        self.maintain_partitions.cancel()
+
+    @tasks.loop(hours=24.0)
+    async def maintain_partitions(self):
+        manager = PartitionManager(self.bot.log)
+
+        await manager.ensure_partitions()
+        if await manager.expire_partitions():
+            # Cached cases may belong to months that were just archived
+            self.bot.cases.clear()
+
+        await self.bot.refresh_partitions()
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if not self.maintain_partitions.is_running():
+            self.maintain_partitions.start()
 
     @commands.group(name='mod')
     @commands.has_permissions(manage_messages=True)
@@ -7,6 +7,7 @@ from discord.ext import commands
 
 from .. import utils
 from ...api import leveling
+from ...constants import Roles, LeaderboardConfig
 from ..utils.embeds import ErrorEmbeds
 from ..utils.embeds import CheckFailures
 from ..utils.embeds import LevelingEmbeds
@@ -23,6 +24,9 @@ class LevelingCog(leveling.API, commands.Cog):
 
     def cog_unload(self):
         self.ensure_configuration.cancel()
+        self.refresh_snapshots.cancel()
+        self.roll_up_history.cancel()
+        asyncio.ensure_future(self.shutdown())
 
     # Extension Configuration
 
@@ -53,11 +57,53 @@ class LevelingCog(leveling.API, commands.Cog):
     async def ensure_configuration(self):
         await self.configure()
 
+        if await super().reconfigure():
+            self.bot.log.debug('discord', f'Leveling Configuration Version {self.progression.version} was Loaded')
+
+    @tasks.loop(seconds=LeaderboardConfig.refresh_interval)
+    async def refresh_snapshots(self):
+        await super().refresh_leaderboards()
+
+    @tasks.loop(hours=1.0)
+    async def roll_up_history(self):
+        await super().compact_history()
+
 
     @commands.Cog.listener()
     async def on_ready(self):
         self.ensure_configuration.start()
 
+        if not self.refresh_snapshots.is_running():
+            self.refresh_snapshots.start()
+        if not self.roll_up_history.is_running():
+            self.roll_up_history.start()
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        await self.enroll_members(guild)
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        if message.author.bot or not message.guild:
+            return
+
+        if discord.utils.get(getattr(message.author, 'roles', ()), id=Roles.blacklisted):
+            return
+
+        prefix = await self.bot.get_prefix(message)
+        if message.content.startswith(prefix if isinstance(prefix, str) else tuple(prefix)):
+            return
+
+        await super().ingest_message(guildId=message.guild.id, userId=message.author.id)
+
+    async def enroll_members(self, guild: discord.Guild) -> leveling.OnboardingProgress:
+        def report(state: leveling.OnboardingProgress) -> None:
+            self.bot.log.trace('discord', f'Enrolling Guild Members - {state}')
+
+        members = [member for member in guild.members if not member.bot]
+
+        return await super().enroll_guild(guildId=guild.id, members=members, progress=report)
+
     # End Region
 
     # Region: Command Interfaces
@@ -89,8 +135,8 @@ class LevelingCog(leveling.API, commands.Cog):
     @xp.command(name='top10', aliases=["top", ])
     @utils.channel_restricted(['bot-commands', ])
     async def guild_top10(self, ctx):
-        profiles = await super().fetch_guild_ranks(guildId=ctx.guild.id, limit=10)
-        embed = LevelingEmbeds.GuildTop10(profiles)
+        snapshot = await super().fetch_leaderboard(guildId=ctx.guild.id)
+        embed = LevelingEmbeds.GuildTop10(snapshot)
 
         return await ctx.send(embed=embed)
 
@@ -126,19 +172,18 @@ class LevelingCog(leveling.API, commands.Cog):
 
     @global_xp.command(name='top10', aliases=["top", ])
     async def global_top10(self, ctx):
-        profiles = await super().fetch_global_ranks(limit=10)
-        embed = LevelingEmbeds.GlobalTop10(profiles)
+        snapshot = await super().fetch_leaderboard()
+        embed = LevelingEmbeds.GlobalTop10(snapshot)
 
         return await ctx.send(embed=embed)
 
     @global_xp.command(name='rank')
-    @commands.cooldown(1, 120, commands.BucketType.user)
     async def global_ranking(self, ctx, user: Optional[discord.Member]):
         if not user:
             user = ctx.author
 
-        position = await super().fetch_global_ranks(userId=user.id)
-        embed = LevelingEmbeds.GlobalRanking(user, position)
+        standing = await super().fetch_global_standing(userId=user.id)
+        embed = LevelingEmbeds.GlobalRanking(user, standing)
 
         return await ctx.send(embed=embed)
 
@@ -203,17 +248,25 @@ class LevelingCog(leveling.API, commands.Cog):
         await ctx.invoke(self.guild_search, member)
 
 
+    @xp.command(name='enroll', aliases=['onboard', ])
+    @utils.developer_only()
+    async def enroll_guild_members(self, ctx):
+        state = await self.enroll_members(ctx.guild)
+        embed = LevelingEmbeds.GuildEnrolled(state)
+
+        return await ctx.send(embed=embed)
+
     @xp.command(name='reconfigure', aliases=['configure', 'refresh'])
     @utils.developer_only()
     async def refresh_configuration(self, ctx):
         self.bot.log.debug('discord', f'Leveling Extension is being reconfigured by: {ctx.author}')
 
-        changed = await self.reconfigure()
+        changed = await super().reconfigure()
 
         if not changed:
-            embed = LevelingEmbeds.NoChanges()
+            embed = LevelingEmbeds.NoChanges(version=self.progression.version)
         else:
-            embed = LevelingEmbeds.Reconfigured()
+            embed = LevelingEmbeds.Reconfigured(version=self.progression.version)
 
         return await ctx.send(embed=embed)
 
@@ -33,7 +33,9 @@ class EmbedGen():
             color = Colors.soft_green
         )
 
-        formatted_changes = [f'**{change["attribute"]}**: {change["before"]} --> {change["after"]}' for change in changed]
+        formatted_changes = [
+            f'**{change["attribute"]}**: {change["before"]} --> {change["after"]}' for change in changed
+        ]
         embed.description = '\n'.join(formatted_changes)
 
         return cls.format(embed, user=None)
@@ -140,15 +142,110 @@ class LevelingEmbeds(EmbedGen):
 
         return cls.format(embed, user=member)
 
+    @classmethod
+    def GuildEnrolled(cls, state: Any) -> Embed:
+        embed = Embed(
+            title = 'Guild Members Enrolled',
+            color = cls.color
+        )
+
+        embed.description = (
+            f"Processed {state.processed}/{state.total} Members \n"
+            f"New Guild Profiles: {state.guild_inserted} \n"
+            f"New Global Profiles: {state.global_inserted}"
+        )
+
+        return cls.format(embed, user=None)
+
+    @classmethod
+    def Leaderboard(cls, title: str, snapshot: Any) -> Embed:
+        embed = Embed(
+            title = title,
+            color = cls.color,
+            timestamp = snapshot.timestamp
+        )
+
+        if not snapshot.entries:
+            embed.description = 'No Experience has been Recorded Yet'
+        else:
+            embed.description = '\n'.join(
+                f"**#{position}** <@{user_id}> - {experience} XP"
+                for position, (user_id, experience) in enumerate(snapshot, 1)
+            )
+
+        minutes, seconds = divmod(int(snapshot.age), 60)
+        age = f'{minutes}m {seconds}s' if minutes else f'{seconds}s'
+        embed.add_field(name='Snapshot Age', value=f'Updated {age} ago', inline=False)
+
+        return cls.format(embed, user=None)
+
+    @classmethod
+    def GuildTop10(cls, snapshot: Any) -> Embed:
+        return cls.Leaderboard('Guild Leaderboard', snapshot)
+
+    @classmethod
+    def GlobalTop10(cls, snapshot: Any) -> Embed:
+        return cls.Leaderboard('Global Leaderboard', snapshot)
+
+    @classmethod
+    def Ranking(cls, title: str, member: Member, position: Optional[int]) -> Embed:
+        embed = Embed(
+            title = title,
+            color = cls.color
+        )
+
+        if position:
+            embed.description = f"{member.mention} is currently ranked **#{position}**"
+        else:
+            embed.description = f"{member.mention} has not been ranked yet"
+
+        return cls.format(embed, user=member)
+
+    @classmethod
+    def GuildRanking(cls, member: Member, position: Optional[int]) -> Embed:
+        return cls.Ranking('Guild Ranking', member, position)
+
+    @classmethod
+    def GlobalRanking(cls, member: Member, standing: Any) -> Embed:
+        if not standing or standing.exact:
+            embed = cls.Ranking('Global Ranking', member, standing.rank if standing else None)
+        else:
+            embed = cls.Ranking('Global Ranking', member, None)
+            embed.description = f"{member.mention} is ranked approximately **#{standing.rank}**"
+
+        if standing:
+            embed.description += f" - Top {standing.percentile:.2f}%"
+
+        return embed
+
+    @classmethod
+    def NoChanges(cls, *, version: int) -> Embed:
+        embed = Embed(
+            title = 'Configuration Unchanged',
+            color = cls.color
+        )
+
+        embed.description = f"The stored Leveling Configuration matches the active one (Version {version})"
+
+        return cls.format(embed, user=None)
+
+    @classmethod
+    def Reconfigured(cls, *, version: int) -> Embed:
+        embed = Embed(
+            title = 'Leveling Extension Reconfigured',
+            color = cls.color
+        )
+
+        embed.description = (
+            f"Now using Leveling Configuration Version {version} \n"
+            f"Cached profiles and boosts from earlier versions will be recalculated on their next use"
+        )
+
+        return cls.format(embed, user=None)
+
     '''
-        - GuildTop10
-        - GuildRanking
-        - GlobalTop10
-        - GlobalRanking
         - Blacklisted
         - Whitelisted
-        - NoChanges (for config)
-        - Reconfigured (for config)
         - ProfileOverwrite (for logging)
     '''
 
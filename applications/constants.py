@@ -234,6 +234,41 @@ class WebServer(metaclass=YAMLGetter):
     database: str
 
 
+class PoolConfig(metaclass=YAMLGetter):
+    category = "apis"
+    section = "database"
+    subsection = "pool"
+
+    min_size: int
+    max_size: int
+    max_queries: int
+    statement_cache: int
+
+    acquire_timeout: int
+    idle_lifetime: int
+    health_interval: int
+
+
+class CursorConfig(metaclass=YAMLGetter):
+    category = "apis"
+    section = "database"
+    subsection = "cursors"
+
+    prefetch: int
+
+
+class MigrationConfig(metaclass=YAMLGetter):
+    category = "apis"
+    section = "database"
+    subsection = "migrations"
+
+    role: str
+    lock_id: int
+    grants: List[str]
+
+    seed_rows: int
+
+
 class EventConfig(metaclass=YAMLGetter):
     category = "apis"
     section = "events"
@@ -259,6 +294,118 @@ class EventConfig(metaclass=YAMLGetter):
     aggressive: List[str]
 
 
+class InfractionCacheConfig(metaclass=YAMLGetter):
+    category = "apis"
+    section = "infractions"
+    subsection = "cache"
+
+    maxsize: int
+    ttl: int
+
+
+class EventBatchConfig(metaclass=YAMLGetter):
+    category = "apis"
+    section = "infractions"
+    subsection = "batching"
+
+    window: float
+    max_batch: int
+    max_embeds: int
+
+
+class InfractionPartitionConfig(metaclass=YAMLGetter):
+    category = "apis"
+    section = "infractions"
+    subsection = "partitions"
+
+    retention_months: int
+    lookahead_months: int
+    compression: int
+
+
+class BufferConfig(metaclass=YAMLGetter):
+    category = "apis"
+    section = "leveling"
+    subsection = "write_behind"
+
+    max_pending: int
+    flush_interval: int
+
+
+class ProfileCacheConfig(metaclass=YAMLGetter):
+    category = "apis"
+    section = "leveling"
+    subsection = "profile_cache"
+
+    maxsize: int
+    ttl: int
+
+
+class OnboardingConfig(metaclass=YAMLGetter):
+    category = "apis"
+    section = "leveling"
+    subsection = "onboarding"
+
+    chunk_size: int
+
+
+class LeaderboardConfig(metaclass=YAMLGetter):
+    category = "apis"
+    section = "leveling"
+    subsection = "leaderboards"
+
+    size: int
+    refresh_interval: int
+
+
+class RankingConfig(metaclass=YAMLGetter):
+    category = "apis"
+    section = "leveling"
+    subsection = "rankings"
+
+    exact_top: int
+    histogram_base: float
+    resync_drift: float
+    guild_indexes: int
+
+
+class HistoryConfig(metaclass=YAMLGetter):
+    category = "apis"
+    section = "leveling"
+    subsection = "history"
+
+    hourly_retention: int
+    daily_retention: int
+
+
+class MaintenanceConfig(metaclass=YAMLGetter):
+    category = "apis"
+    section = "leveling"
+    subsection = "maintenance"
+
+    chunk_size: int
+    duty_cycle: float
+
+
+class BackupConfig(metaclass=YAMLGetter):
+    category = "apis"
+    section = "leveling"
+    subsection = "backups"
+
+    chunk_rows: int
+    workers: int
+    compression: int
+
+
+class MessageConfig(metaclass=YAMLGetter):
+    category = "apis"
+    section = "leveling"
+    subsection = "messages"
+
+    cooldown: int
+    sweep_interval: int
+
+
 class Boosts(metaclass=YAMLGetter):
     category = "apis"
     section = "leveling"
@@ -0,0 +1,82 @@
+''' Compares the memory held by 100k cached guild profiles under the old and new container layouts
+
+    Run from the repository root:  python -m benchmarks.profile_memory [count]
+'''
+
+import sys
+import gc
+import tracemalloc
+
+from typing import Callable
+
+from applications.api.leveling import GuildUser, Statistic
+
+
+class LegacyGuildUser():
+    ''' The original `**kwargs` + `setattr` container, kept here only for comparison '''
+
+    def __init__(self, guild: int, **kwargs):
+        self.guild_id = guild
+
+        for attribute in kwargs:
+            setattr(self, attribute, kwargs[attribute])
+
+
+class LegacyStatistic(object):
+    def __init__(self, **kwargs):
+        if kwargs:
+            for attribute in kwargs:
+                setattr(self, attribute, kwargs[attribute])
+
+
+def build_legacy(count: int) -> list:
+    return [
+        LegacyGuildUser(1,
+            user_id = user,
+            experience = user * 7,
+            artificial = 0,
+            prestige = LegacyStatistic(current='Not Prestiged', next='1st Prestige', remaining=user),
+            level = LegacyStatistic(current='Level 1', next='Level 2', remaining=user)
+        )
+        for user in range(count)
+    ]
+
+
+def build_slotted(count: int) -> list:
+    return [
+        GuildUser(1,
+            user_id = user,
+            experience = user * 7,
+            artificial = 0,
+            prestige = Statistic(current='Not Prestiged', next='1st Prestige', remaining=user),
+            level = Statistic(current='Level 1', next='Level 2', remaining=user)
+        )
+        for user in range(count)
+    ]
+
+
+def measure(builder: Callable[[int], list], count: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+
+    profiles = builder(count)
+    current, _ = tracemalloc.get_traced_memory()
+
+    tracemalloc.stop()
+    del profiles
+
+    return current
+
+
+def main(count: int) -> None:
+    legacy = measure(build_legacy, count)
+    slotted = measure(build_slotted, count)
+
+    print(f'Profiles: {count}')
+    print(f'Legacy (__dict__):  {legacy / 2**20:8.2f} MiB  ({legacy / count:6.1f} B/profile)')
+    print(f'Slotted:            {slotted / 2**20:8.2f} MiB  ({slotted / count:6.1f} B/profile)')
+    print(f'Reduction:          {100 * (1 - slotted / legacy):8.1f} %')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,37 @@
+import asyncio
+
+from applications.api import leveling
+
+
+class SilentLog():
+    def __getattr__(self, level):
+        return lambda *args: None
+
+
+class BufferedOnly(leveling.API):
+    ''' Leveling API without a Database - every stored row is missing '''
+
+    async def load_config(self) -> dict:
+        return self.get_static_config()
+
+    async def fetch_settled(self, name: str, args: tuple) -> None:
+        return None
+
+
+def test_buffered_experience_without_stored_rows():
+    api = BufferedOnly(SilentLog())
+
+    async def scenario():
+        await api.update_config()
+
+        api.experience_buffer.add(7, guildId=3, amount=40)
+        api.experience_buffer.add(7, guildId=3, amount=15, artificial=True)
+
+        return await api.fetch_guild_user(guildId=3, userId=7), await api.fetch_global_user(userId=7)
+
+    guild_user, global_user = asyncio.run(scenario())
+
+    assert (guild_user.experience, guild_user.artificial) == (55, 15)
+    assert guild_user.level.current == api.progression.level(55).current
+    assert global_user.experience == 40
+    assert global_user.boost.current == api.progression.boost(40).current
@@ -0,0 +1,42 @@
+import pytest
+
+from applications.api import leveling
+from applications.api.progression import ProgressionTable
+
+
+numpy = pytest.importorskip('numpy')
+
+
+def boundary_values(table: ProgressionTable) -> list:
+    ''' Every configured bound, its neighbours, zero and values past the top bound '''
+
+    bounds = set(table.set_bounds)
+
+    for ladder in (table.prestiges, table.leagues, table.boosts):
+        bounds.update(ladder.bounds)
+
+    for level_bounds in table.level_sets.values():
+        bounds.update(level_bounds)
+        bounds.update(bound + table.cycle for bound in level_bounds)
+
+    top = max(bounds)
+    values = {0, 1, table.cycle, top * 2, top * 10}
+
+    for bound in bounds:
+        values.update(value for value in (bound - 1, bound, bound + 1) if value >= 0)
+
+    return sorted(values)
+
+
+def test_vectorized_conversion_matches_bisect():
+    table = ProgressionTable(leveling.API.get_static_config(), statistic=leveling.Statistic)
+    experience = boundary_values(table)
+
+    vectorized = table.convert_many(experience, vectorized=True)
+    bisected = table.convert_many(experience, vectorized=False)
+
+    assert set(vectorized) == set(bisected) == set(table.columns)
+
+    for column in table.columns:
+        assert vectorized[column] == bisected[column], column
+        assert [type(value) for value in vectorized[column]] == [type(value) for value in bisected[column]], column